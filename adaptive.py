@@ -0,0 +1,119 @@
+"""
+Calidad adaptativa: elige tamaño de YOLO11 e imgsz para mantener la latencia por frame dentro de un objetivo
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from model_cache import MODEL_OPTIONS
+
+IMGSZ_STEPS = (320, 416, 512, 640)
+# Frames medidos en un nivel antes de decidir si cambiar
+WINDOW = int(os.environ.get("YOLO_ADAPTIVE_WINDOW", "8"))
+# Solo se sube de nivel si la latencia actual deja este margen respecto al objetivo
+HEADROOM = float(os.environ.get("YOLO_ADAPTIVE_HEADROOM", "0.6"))
+# Segundos durante los que la latencia medida en un nivel se considera vigente
+ESTIMATE_TTL = 30.0
+
+
+def quality_ladder(max_weights=None, imgsz_steps=IMGSZ_STEPS):
+    """Niveles (pesos, imgsz) de menor a mayor coste: primero la resolución del modelo nano y después el tamaño"""
+    weights = list(MODEL_OPTIONS.values())
+    if max_weights in weights:
+        weights = weights[:weights.index(max_weights) + 1]
+    ladder = [(weights[0], imgsz) for imgsz in imgsz_steps]
+    ladder.extend((name, imgsz_steps[-1]) for name in weights[1:])
+    return ladder
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+class AdaptiveController:
+    """Baja un nivel cuando la mediana de latencia supera el objetivo y sube cuando sobra margen"""
+
+    def __init__(self, target_ms, ladder=None, period_s=None, window=WINDOW, headroom=HEADROOM):
+        self.target_ms = target_ms
+        self.ladder = ladder or quality_ladder()
+        # Periodo de captura pedido (objetivo en FPS); con objetivo de latencia se captura en cuanto se puede
+        self.period_s = period_s
+        self.window = max(1, window)
+        self.headroom = headroom
+        # Empezar en el nivel por defecto de la aplicación (nano a 640) o el más alto disponible
+        self.level = min(len(IMGSZ_STEPS) - 1, len(self.ladder) - 1)
+        self.switches = 0
+        self._recent = deque(maxlen=self.window)
+        self._estimates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_fps(cls, fps, **kwargs):
+        """Objetivo en FPS: cada frame debe procesarse dentro de su periodo"""
+        return cls(1000.0 / fps, period_s=1.0 / fps, **kwargs)
+
+    def current(self):
+        """Nivel actual: (índice, pesos, imgsz)"""
+        with self._lock:
+            return (self.level, *self.ladder[self.level])
+
+    def observe(self, ms, level=None):
+        """Registrar la latencia de un frame procesado en `level` y cambiar de nivel si hace falta"""
+        with self._lock:
+            level = self.level if level is None else level
+            previous = self._estimates.get(level)
+            estimate = ms if previous is None else 0.7 * previous[0] + 0.3 * ms
+            self._estimates[level] = (estimate, time.monotonic())
+            # Frames que se empezaron antes del último cambio no cuentan para el nivel actual
+            if level != self.level:
+                return self.level
+            self._recent.append(ms)
+            if len(self._recent) < self.window:
+                return self.level
+
+            latency = median(self._recent)
+            if latency > self.target_ms and self.level > 0:
+                self._switch(self.level - 1)
+            elif latency < self.target_ms * self.headroom and self.level + 1 < len(self.ladder):
+                # No volver a un nivel que hace poco no cumplía el objetivo
+                known = self._estimates.get(self.level + 1)
+                if known is None or known[0] <= self.target_ms or time.monotonic() - known[1] > ESTIMATE_TTL:
+                    self._switch(self.level + 1)
+            return self.level
+
+    def _switch(self, level):
+        self.level = level
+        self.switches += 1
+        self._recent.clear()
+
+    def latency_ms(self):
+        """Latencia reciente del nivel actual (mediana de la ventana o estimación previa)"""
+        with self._lock:
+            if self._recent:
+                return median(self._recent)
+            estimate = self._estimates.get(self.level)
+            return estimate[0] if estimate is not None else None
+
+    def capture_interval(self, min_interval=0.5):
+        """Segundos entre capturas: el periodo pedido, sin bajar de la latencia medida con margen"""
+        latency = self.latency_ms()
+        interval = max(min_interval, self.period_s or 0.0)
+        if latency is not None:
+            interval = max(interval, latency * 1.2 / 1000)
+        return interval
+
+    def state(self):
+        """Resumen para mostrar en la interfaz"""
+        level, weights, imgsz = self.current()
+        latency = self.latency_ms()
+        return {
+            "nivel": f"{level + 1}/{len(self.ladder)}",
+            "modelo": weights,
+            "imgsz": imgsz,
+            "latencia_ms": round(latency, 1) if latency is not None else None,
+            "objetivo_ms": round(self.target_ms, 1),
+            "cambios": self.switches,
+        }
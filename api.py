@@ -0,0 +1,313 @@
+"""
+API HTTP de inferencia sin interfaz (imagen, lote de imágenes y trabajos de video)
+"""
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch_inference import decode_image_bytes
+from detections import records_from_array, results_to_array
+from jobs import get_job_manager
+from metrics import PROMETHEUS_CONTENT_TYPE, get_metrics
+from model_cache import MODEL_OPTIONS, get_registry
+from scheduler import get_scheduler
+from startup import PRELOAD_MODELS, WARM_START, autotune_at_start, get_startup_timer, warm_start
+from uploads import spool_upload
+
+# Solo local por defecto: la API no tiene autenticación; YOLO_API_HOST=0.0.0.0 la expone a la red
+API_HOST = os.environ.get("YOLO_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("YOLO_API_PORT", "8000"))
+API_ENABLED = os.environ.get("YOLO_API_ENABLED", "0") == "1"
+DEFAULT_MODEL = os.environ.get("YOLO_API_MODEL", "yolo11n.pt")
+# Tamaño máximo del cuerpo de una petición (imágenes, lotes y videos)
+MAX_BODY_BYTES = int(float(os.environ.get("YOLO_API_MAX_BODY_MB", "200")) * 1024 * 1024)
+# Tamaños de entrada admitidos: múltiplos del stride de YOLO11 hasta el máximo de la interfaz
+IMGSZ_STRIDE = 32
+MAX_IMGSZ = 1280
+# Frames por lote de los trabajos de video: el mismo rango que el deslizador de la interfaz
+MAX_VIDEO_BATCH = 16
+ALLOWED_MODELS = set(MODEL_OPTIONS.values())
+
+
+class BodyReader:
+    """Lector limitado al Content-Length de la petición"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def seek(self, offset):
+        # El cuerpo solo se puede leer una vez
+        pass
+
+
+class ApiError(Exception):
+    """Error de la petición con su código HTTP"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def inference_params(query):
+    """Leer modelo y parámetros de inferencia de la query string"""
+    model = query.get("model", [DEFAULT_MODEL])[0]
+    if model not in ALLOWED_MODELS:
+        raise ApiError(400, f"Modelo no permitido: {model}")
+    try:
+        params = {
+            "conf": float(query.get("conf", ["0.25"])[0]),
+            "iou": float(query.get("iou", ["0.7"])[0]),
+            "imgsz": int(query.get("imgsz", ["640"])[0]),
+        }
+    except ValueError as e:
+        raise ApiError(400, f"Parámetro inválido: {e}")
+    imgsz = params["imgsz"]
+    if not IMGSZ_STRIDE <= imgsz <= MAX_IMGSZ or imgsz % IMGSZ_STRIDE:
+        raise ApiError(400, f"imgsz debe ser múltiplo de {IMGSZ_STRIDE} entre {IMGSZ_STRIDE} y {MAX_IMGSZ}")
+    return model, params
+
+
+def detect_images(model, images, params):
+    """Enviar imágenes al planificador (se agrupan con las de otros clientes) y esperar resultados"""
+    scheduler = get_scheduler(model)
+    start = time.perf_counter()
+    futures = [scheduler.submit(image, **params) for image in images]
+    results = [future.result() for future in futures]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    get_metrics().observe_results(results, "api")
+    return [
+        {
+            "width": image.shape[1],
+            "height": image.shape[0],
+            "detections": records_from_array(results_to_array(result), result.names),
+        }
+        for image, result in zip(images, results)
+    ], elapsed_ms
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """Rutas de la API"""
+
+    server_version = "YOLO11API/1.0"
+
+    def _send_json(self, status, payload):
+        with get_metrics().time("encode", "api"):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send_body(status, body, "application/json; charset=utf-8")
+
+    def _send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def _body_length(self):
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            raise ApiError(400, "Content-Length inválido")
+        if length <= 0:
+            raise ApiError(400, "Cuerpo de la petición vacío")
+        if length > MAX_BODY_BYTES:
+            # El cuerpo no se lee: la conexión se cierra tras responder
+            self.close_connection = True
+            raise ApiError(413, f"Cuerpo demasiado grande (máximo {MAX_BODY_BYTES // (1024 * 1024)} MB)")
+        return length
+
+    def _handle(self, routes):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            for matcher, handler in routes:
+                args = matcher(parts)
+                if args is not None:
+                    return handler(query, *args)
+            raise ApiError(404, "Ruta no encontrada")
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def do_GET(self):
+        self._handle([
+            (lambda p: () if p == ["health"] else None, self.get_health),
+            (lambda p: () if p == ["metrics"] else None, self.get_prometheus_metrics),
+            (lambda p: () if p == ["v1", "jobs"] else None, self.get_jobs),
+            (lambda p: (p[2],) if len(p) == 3 and p[:2] == ["v1", "jobs"] else None, self.get_job),
+            (lambda p: (p[2],) if len(p) == 4 and p[:2] == ["v1", "jobs"] and p[3] == "output" else None,
+             self.get_job_output),
+        ])
+
+    def do_POST(self):
+        self._handle([
+            (lambda p: () if p == ["v1", "detect"] else None, self.post_detect),
+            (lambda p: () if p == ["v1", "detect", "batch"] else None, self.post_detect_batch),
+            (lambda p: () if p == ["v1", "jobs", "video"] else None, self.post_video_job),
+            (lambda p: (p[2],) if len(p) == 4 and p[:2] == ["v1", "jobs"] and p[3] == "cancel" else None,
+             self.post_cancel_job),
+        ])
+
+    def get_health(self, query):
+        self._send_json(200, {"status": "ok", "models": get_registry().stats(), "startup": get_startup_timer().rows()})
+
+    def get_prometheus_metrics(self, query):
+        self._send_body(200, get_metrics().prometheus_text().encode("utf-8"), PROMETHEUS_CONTENT_TYPE)
+
+    def post_detect(self, query):
+        """Una imagen en el cuerpo (bytes JPEG/PNG)"""
+        model, params = inference_params(query)
+        data = self.rfile.read(self._body_length())
+        try:
+            with get_metrics().time("decode", "api"):
+                image = decode_image_bytes(data)
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        records, elapsed_ms = detect_images(model, [image], params)
+        self._send_json(200, {"model": model, "ms": round(elapsed_ms, 1), **records[0]})
+
+    def post_detect_batch(self, query):
+        """JSON con {"images": [{"name": ..., "data": base64}, ...]}"""
+        model, params = inference_params(query)
+        try:
+            payload = json.loads(self.rfile.read(self._body_length()))
+            items = payload["images"]
+            images = []
+            for item in items:
+                with get_metrics().time("decode", "api"):
+                    images.append(decode_image_bytes(base64.b64decode(item["data"])))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ApiError(400, f"Lote inválido: {e}")
+        records, elapsed_ms = detect_images(model, images, params)
+        for item, record in zip(items, records):
+            record["name"] = item.get("name")
+        self._send_json(200, {"model": model, "ms": round(elapsed_ms, 1), "results": records})
+
+    def post_video_job(self, query):
+        """Video en el cuerpo; se encola y se procesa en segundo plano"""
+        model, params = inference_params(query)
+        try:
+            options = {
+                "batch_size": int(query.get("batch_size", ["4"])[0]),
+                "detect_every": int(query.get("detect_every", ["1"])[0]),
+                "scene_threshold": float(query.get("scene_threshold", ["0"])[0]),
+            }
+        except ValueError as e:
+            raise ApiError(400, f"Parámetro inválido: {e}")
+        if not 1 <= options["batch_size"] <= MAX_VIDEO_BATCH:
+            raise ApiError(400, f"batch_size debe estar entre 1 y {MAX_VIDEO_BATCH}")
+        if options["detect_every"] < 1:
+            raise ApiError(400, "detect_every debe ser al menos 1")
+        if not options["scene_threshold"] >= 0:
+            raise ApiError(400, "scene_threshold no puede ser negativo")
+        manager = get_job_manager()
+        # Carpeta propia de la petición: la copia deduplicada de otras subidas o sesiones no se toca
+        with tempfile.TemporaryDirectory(prefix=".upload-", dir=manager.directory) as directory:
+            path = spool_upload(BodyReader(self.rfile, self._body_length()), directory=directory, suffix=".mp4")
+            job = manager.submit(path, model, params, options, name=query.get("name", [None])[0])
+        self._send_json(202, {"job_id": job["job_id"], "status": job["status"]})
+
+    def get_jobs(self, query):
+        self._send_json(200, {"jobs": get_job_manager().list_jobs()})
+
+    def get_job(self, query, job_id):
+        job = get_job_manager().get(job_id)
+        if job is None:
+            raise ApiError(404, "Trabajo no encontrado")
+        self._send_json(200, job)
+
+    def post_cancel_job(self, query, job_id):
+        manager = get_job_manager()
+        if manager.get(job_id) is None:
+            raise ApiError(404, "Trabajo no encontrado")
+        if not manager.cancel(job_id):
+            raise ApiError(409, "El trabajo ya ha terminado")
+        self._send_json(202, manager.get(job_id))
+
+    def get_job_output(self, query, job_id):
+        job = get_job_manager().get(job_id) or {}
+        if job.get("status") != "done":
+            raise ApiError(404, "El resultado aún no está disponible")
+        self._send_file(job["output_path"], "video/mp4")
+
+    def log_message(self, format, *args):
+        # Silenciar el log por petición del servidor base
+        pass
+
+
+def serve(host=API_HOST, port=API_PORT):
+    """Crear el servidor HTTP de la API"""
+    return ThreadingHTTPServer((host, port), InferenceHandler)
+
+
+_background_server = None
+_background_lock = threading.Lock()
+
+
+def start_in_background(host=API_HOST, port=API_PORT):
+    """Iniciar la API una sola vez por proceso en un hilo (p. ej. dentro del servidor de Streamlit)"""
+    global _background_server
+    with _background_lock:
+        if _background_server is None:
+            _background_server = serve(host, port)
+            threading.Thread(target=_background_server.serve_forever, name="api-server", daemon=True).start()
+        return _background_server
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="API HTTP de inferencia YOLO11")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--warm", action="store_true", default=WARM_START,
+                        help="Precargar y calentar los modelos antes de aceptar peticiones")
+    args = parser.parse_args()
+
+    # Auto-ajuste de hilos (YOLO_AUTOTUNE=1) antes de aceptar peticiones
+    autotune_at_start()
+    if args.warm:
+        # Los modelos configurados y el modelo por defecto de la API
+        warm_start(list(dict.fromkeys(PRELOAD_MODELS + [DEFAULT_MODEL])))
+        print(f"🔥 Modelos precargados en {get_startup_timer().total():.1f}s")
+    server = serve(args.host, args.port)
+    print(f"🚀 API YOLO11 escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 API detenida por el usuario")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
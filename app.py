@@ -1,26 +1,77 @@
 import streamlit as st
-import tempfile
 import os
 import numpy as np
-from PIL import Image
 import threading
 import time
 
-# Intentar importar dependencias con manejo de errores
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError as e:
-    st.error(f"Error importando YOLO: {e}")
-    YOLO_AVAILABLE = False
+_import_start = time.perf_counter()
+
+import runtime_config
+import scheduler
+from adaptive import AdaptiveController, quality_ladder
+from metrics import METRICS_ENABLED, get_metrics, start_metrics_server
+from backends import BACKENDS, QUANTIZED_FORMATS, benchmark_backends, exported_path, resolve_model
+from detections import results_to_array
+from model_cache import MODEL_OPTIONS, get_registry
+from result_cache import cached_predict
+from startup import WARM_START, autotune_at_start, get_startup_timer, is_installed, start_warm_start_in_background
+from uploads import cleanup_uploads, spool_upload
+
+# ultralytics y torch se importan al cargar el primer modelo: aquí solo se comprueba que estén instalados
+YOLO_AVAILABLE = is_installed("ultralytics")
+if not YOLO_AVAILABLE:
+    st.error("Error importando YOLO: No module named 'ultralytics'")
 
 try:
     import cv2
+    from batch_inference import decode_image, decode_image_bytes, iter_folder_images, iter_uploaded_images, run_batches, summary_rows, to_csv, to_json
+    from video_pipeline import DEFAULT_WORKERS
+    from jobs import FINISHED, get_job_manager
+    from tracking import SCENE_THRESHOLD, TrackedDetector
+    from streaming import LatestFrameReader, LatestFrameWorker, SessionResource, SyntheticFrameSource
+    from quantization import CALIBRATION_DIR, agreement_report
+    from renderer import detection_rows, draw_detections, render_result
+    from tiling import tiled_predict
     CV2_AVAILABLE = True
 except ImportError as e:
     st.error(f"Error importando OpenCV: {e}")
     CV2_AVAILABLE = False
 
+# API HTTP de inferencia (opcional, activada con YOLO_API_ENABLED=1)
+try:
+    from api import API_ENABLED, start_in_background
+    API_AVAILABLE = True
+except ImportError:
+    API_AVAILABLE = False
+
+# Streaming continuo por WebRTC (opcional)
+try:
+    import av
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+    WEBRTC_AVAILABLE = True
+except ImportError:
+    WEBRTC_AVAILABLE = False
+
+# Tamaño de entrada por defecto de YOLO11: las imágenes subidas mucho mayores se decodifican reducidas
+MODEL_IMGSZ = 640
+
+# Carpeta del servidor cuyos archivos pueden leer los visitantes; sin configurar, no se ofrece ninguna ruta
+SERVER_MEDIA_ROOT = os.environ.get("YOLO_SERVER_MEDIA_ROOT", "")
+
+def resolve_server_path(path):
+    """Ruta real dentro de SERVER_MEDIA_ROOT, o None si queda fuera (enlaces y '..' incluidos)"""
+    if not SERVER_MEDIA_ROOT or not path:
+        return None
+    root = os.path.realpath(SERVER_MEDIA_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        return None
+    return resolved
+
+# Solo la primera ejecución del script paga las importaciones; las siguientes las reutilizan
+if not get_startup_timer().recorded("importar módulos de la app"):
+    get_startup_timer().record("importar módulos de la app", time.perf_counter() - _import_start)
+
 def main():
     # Configuración de la página
     st.set_page_config(
@@ -30,6 +81,26 @@ def main():
         initial_sidebar_state="expanded"
     )
     
+    # Arranque en caliente (YOLO_WARM_START=1): precargar y calentar los pesos configurados en segundo plano;
+    # run.py --warm ya la lanza al arrancar, esto cubre `streamlit run app.py`
+    if WARM_START and YOLO_AVAILABLE:
+        start_warm_start_in_background()
+    
+    # API HTTP en el mismo proceso para compartir la caché de modelos; run.py --api ya la inicia al arrancar,
+    # esto cubre `streamlit run app.py` con YOLO_API_ENABLED=1
+    if API_AVAILABLE and API_ENABLED:
+        try:
+            start_in_background()
+        except OSError as e:
+            st.sidebar.warning(f"⚠️ No se pudo iniciar la API: {e}")
+    
+    # Endpoint de métricas Prometheus (opcional, activado con YOLO_METRICS_ENABLED=1)
+    if METRICS_ENABLED:
+        try:
+            start_metrics_server()
+        except OSError as e:
+            st.sidebar.warning(f"⚠️ No se pudo iniciar el endpoint de métricas: {e}")
+    
     # Título principal
     st.title("🎯 YOLO11 Detección de Objetos en Tiempo Real")
     st.markdown("### Powered by Ultralytics YOLO11")
@@ -49,13 +120,7 @@ def main():
     st.sidebar.header("⚙️ Configuración")
     
     # Selección del modelo
-    model_options = {
-        "YOLO11n (Nano - Más rápido)": "yolo11n.pt",
-        "YOLO11s (Small)": "yolo11s.pt", 
-        "YOLO11m (Medium)": "yolo11m.pt",
-        "YOLO11l (Large)": "yolo11l.pt",
-        "YOLO11x (Extra Large - Más preciso)": "yolo11x.pt"
-    }
+    model_options = MODEL_OPTIONS
     
     selected_model_name = st.sidebar.selectbox(
         "🔧 Seleccionar Modelo YOLO11",
@@ -66,6 +131,14 @@ def main():
     
     selected_model = model_options[selected_model_name]
     
+    # Backend de inferencia en CPU
+    selected_backend = st.sidebar.selectbox(
+        "🧠 Backend de inferencia",
+        options=list(BACKENDS.keys()),
+        index=0,
+        help="ONNX Runtime, OpenVINO y TorchScript exportan el modelo una vez y lo guardan en disco"
+    )
+    
     # Configuración de confianza
     confidence = st.sidebar.slider(
         "🎯 Umbral de Confianza",
@@ -90,36 +163,173 @@ def main():
     st.sidebar.header("📹 Fuente de Entrada")
     input_type = st.sidebar.radio(
         "Seleccionar fuente:",
-        ["Cámara Web", "Captura de Imagen", "Archivo de Video", "Imagen"],
-        help="Elige entre usar tu cámara web, capturar una imagen, subir un archivo o una imagen"
+        ["Cámara Web", "Captura de Imagen", "Archivo de Video", "Imagen", "Cámara del Servidor"],
+        help="Elige entre usar tu cámara web, capturar una imagen, subir un archivo, una imagen o la cámara conectada al servidor"
     )
     
     # Información del modelo seleccionado
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"**Modelo actual:** {selected_model_name}")
+    st.sidebar.markdown(f"**Backend:** {selected_backend}")
     st.sidebar.markdown(f"**Confianza:** {confidence}")
     st.sidebar.markdown(f"**IoU:** {iou}")
     
     # Inicializar estado de sesión
-    if 'model' not in st.session_state:
-        st.session_state.model = None
     if 'model_name' not in st.session_state:
         st.session_state.model_name = None
     if 'stop_camera' not in st.session_state:
         st.session_state.stop_camera = False
     
-    # Cargar modelo si es necesario
-    if st.session_state.model is None or st.session_state.model_name != selected_model:
-        with st.spinner(f"Cargando modelo {selected_model_name}..."):
+    # Hilos de CPU: configuración del entorno y auto-ajuste opcional (run.py y api.py lo hacen al arrancar;
+    # con `streamlit run app.py` lo paga solo la primera sesión)
+    runtime_config.apply_startup_settings()
+    if runtime_config.AUTOTUNE_ON_START and not get_startup_timer().recorded("auto-ajuste de hilos"):
+        with st.spinner("Midiendo la mejor configuración de hilos para este equipo..."):
+            autotune_at_start()
+    
+    # Cargar modelo desde la caché compartida del proceso si es necesario
+    registry = get_registry()
+    model_path = exported_path(selected_model, BACKENDS[selected_backend]) if BACKENDS[selected_backend] else selected_model
+    if st.session_state.model_name != model_path or not registry.is_loaded(model_path):
+        with st.spinner(f"Cargando modelo {selected_model_name} ({selected_backend})..."):
             try:
-                st.session_state.model = YOLO(selected_model)
-                # Forzar uso de CPU para evitar problemas de CUDA
-                st.session_state.model.to('cpu')
-                st.session_state.model_name = selected_model
-                st.success(f"✅ Modelo {selected_model_name} cargado exitosamente (CPU)")
+                model_path = resolve_model(selected_model, selected_backend)
+                registry.get(model_path, device='cpu')
+                st.session_state.model_name = model_path
+                st.success(f"✅ Modelo {selected_model_name} cargado exitosamente ({selected_backend}, CPU)")
             except Exception as e:
                 st.error(f"❌ Error cargando modelo: {str(e)}")
-                st.session_state.model = None
+                st.session_state.model_name = None
+    
+    # Hilos de CPU (configuración compartida por todo el proceso)
+    with st.sidebar.expander("🧵 Hilos de CPU"):
+        thread_settings = runtime_config.get_settings()
+        cpu_count = runtime_config.CPU_COUNT
+        st.slider(
+            "Hilos intra-op por inferencia",
+            min_value=1,
+            max_value=max(2, cpu_count),
+            value=min(thread_settings['intra_threads'] or cpu_count, cpu_count),
+            key='intra_threads',
+            on_change=lambda: runtime_config.apply_thread_settings(intra_threads=st.session_state.intra_threads)
+        )
+        st.number_input(
+            "Hilos inter-op",
+            min_value=0,
+            max_value=cpu_count,
+            value=thread_settings['inter_threads'],
+            key='inter_threads',
+            help="Solo se puede fijar antes de la primera inferencia; usa YOLO_INTER_OP_THREADS al arrancar",
+            on_change=lambda: runtime_config.apply_thread_settings(inter_threads=st.session_state.inter_threads)
+        )
+        st.slider(
+            "Réplicas por modelo",
+            min_value=1,
+            max_value=max(2, min(8, cpu_count)),
+            value=min(thread_settings['workers_per_model'], max(2, min(8, cpu_count))),
+            key='workers_per_model',
+            help="Inferencias simultáneas por modelo; cada réplica ocupa memoria adicional",
+            on_change=lambda: runtime_config.configure(workers_per_model=st.session_state.workers_per_model)
+        )
+        st.text_input(
+            "Afinidad de CPU (p. ej. 0-3)",
+            value=",".join(str(c) for c in thread_settings['affinity']),
+            key='cpu_affinity',
+            help="CPUs de todo el proceso, incluido el pool de hilos de torch; vacío para no fijar",
+            on_change=lambda: runtime_config.configure(affinity=st.session_state.cpu_affinity)
+        )
+        if st.button("Auto-ajustar", key="autotune_threads"):
+            with st.spinner("Midiendo configuraciones de hilos..."):
+                try:
+                    rows, best = runtime_config.autotune(selected_model)
+                    runtime_config.apply_thread_settings(intra_threads=best['intra_threads'])
+                    runtime_config.configure(workers_per_model=best['workers_per_model'])
+                    st.session_state.autotune_rows = rows
+                    st.success(f"✅ {best['intra_threads']} hilos intra-op, {best['workers_per_model']} réplicas")
+                except Exception as e:
+                    st.error(f"❌ Error en el auto-ajuste: {str(e)}")
+        if st.session_state.get('autotune_rows'):
+            st.dataframe(st.session_state.autotune_rows, use_container_width=True)
+    
+    # Micro-lotes entre sesiones (configuración compartida por todo el proceso)
+    with st.sidebar.expander("🚦 Micro-lotes entre sesiones"):
+        settings = scheduler.get_settings()
+        st.session_state.use_scheduler = st.checkbox(
+            "Agrupar inferencias de todas las sesiones",
+            value=st.session_state.get('use_scheduler', scheduler.ENABLED_BY_DEFAULT),
+            help="Las imágenes de usuarios simultáneos se ejecutan juntas en un solo lote por modelo"
+        )
+        st.slider(
+            "Tamaño máximo de lote",
+            min_value=1,
+            max_value=32,
+            value=settings['max_batch'],
+            key='scheduler_max_batch',
+            on_change=lambda: scheduler.configure(max_batch=st.session_state.scheduler_max_batch)
+        )
+        st.slider(
+            "Espera máxima (ms)",
+            min_value=0,
+            max_value=100,
+            value=int(settings['max_wait_ms']),
+            key='scheduler_max_wait',
+            help="Más espera forma lotes más grandes a cambio de algo más de latencia",
+            on_change=lambda: scheduler.configure(max_wait_ms=st.session_state.scheduler_max_wait)
+        )
+        stats = scheduler.scheduler_stats()
+        if stats:
+            st.dataframe(stats, use_container_width=True)
+    
+    # Comparación de latencia entre backends
+    with st.sidebar.expander("⏱️ Comparar backends"):
+        compare_backends = st.multiselect(
+            "Backends a comparar",
+            options=list(BACKENDS.keys()),
+            default=list(BACKENDS.keys())
+        )
+        if st.button("Medir latencia", key="benchmark_backends"):
+            with st.spinner("Exportando y midiendo backends..."):
+                st.session_state.backend_benchmark = benchmark_backends(selected_model, compare_backends, registry)
+        if st.session_state.get('backend_benchmark'):
+            st.dataframe(st.session_state.backend_benchmark, use_container_width=True)
+    
+    # Informe de variantes cuantizadas frente al modelo FP32
+    with st.sidebar.expander("📉 Informe de cuantización"):
+        st.caption(f"Imágenes de calibración: carpeta '{CALIBRATION_DIR}' (o ejemplos de Ultralytics)")
+        quantized_variants = [name for name, fmt in BACKENDS.items()
+                              if fmt in QUANTIZED_FORMATS or (fmt or "").endswith("fp16")]
+        if st.button("Generar informe", key="quantization_report"):
+            with st.spinner("Cuantizando y comparando con FP32..."):
+                try:
+                    candidates = {name: resolve_model(selected_model, name) for name in quantized_variants}
+                    st.session_state.quantization_report = agreement_report(
+                        selected_model, candidates, registry, conf=confidence, iou=iou
+                    )
+                except Exception as e:
+                    st.error(f"❌ Error generando el informe: {str(e)}")
+        if st.session_state.get('quantization_report'):
+            st.dataframe(st.session_state.quantization_report, use_container_width=True)
+            st.caption("Concordancia: detecciones FP32 reproducidas (IoU ≥ 0.5). Clase OK: emparejadas con la misma clase.")
+    
+    # Latencias por etapa de todas las sesiones del proceso
+    with st.sidebar.expander("📈 Latencia por etapa"):
+        stage_rows = get_metrics().summary_rows()
+        if stage_rows:
+            st.dataframe(stage_rows, use_container_width=True)
+        else:
+            st.caption("Aún no hay mediciones")
+        if METRICS_ENABLED:
+            st.caption("Formato Prometheus en el puerto de métricas, ruta /metrics")
+        if st.button("Reiniciar métricas", key="reset_metrics"):
+            get_metrics().reset()
+            st.rerun()
+    
+    # Tiempo de arranque del proceso por fase
+    with st.sidebar.expander("🚀 Arranque"):
+        startup_rows = get_startup_timer().rows()
+        st.dataframe(startup_rows, use_container_width=True)
+        st.caption(f"Total: {get_startup_timer().total():.2f}s"
+                   + ("" if WARM_START else " · YOLO_WARM_START=1 precarga los pesos al iniciar"))
     
     # Área principal
     col1, col2 = st.columns([2, 1])
@@ -127,12 +337,20 @@ def main():
     with col1:
         st.header("🚀 Detección de Objetos")
         
+        # Fuera de los modos de streaming no queda ningún worker ni lector de la sesión en marcha
+        if input_type != "Cámara del Servidor" and st.session_state.get('server_capture') is not None:
+            stop_server_capture()
+        if input_type not in ("Cámara del Servidor", "Cámara Web"):
+            stop_stream_worker()
+        
         if input_type == "Imagen":
             handle_image_input(confidence, iou)
         elif input_type == "Archivo de Video":
             handle_video_input(confidence, iou)
         elif input_type == "Captura de Imagen":
             handle_camera_capture(confidence, iou)
+        elif input_type == "Cámara del Servidor":
+            handle_server_camera(confidence, iou)
         else:  # Cámara Web
             handle_webcam_input(confidence, iou)
     
@@ -177,10 +395,91 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
+def predict_with_model(model_name, source, use_scheduler=False, metrics_input="app", **kwargs):
+    """Inferencia con la caché compartida; las imágenes sueltas pueden pasar por el planificador de micro-lotes"""
+    if use_scheduler and isinstance(source, np.ndarray):
+        results = [scheduler.get_scheduler(model_name).predict(source, **kwargs)]
+    else:
+        results = get_registry().predict(model_name, source, device='cpu', **kwargs)
+    get_metrics().observe_results(results, metrics_input)
+    return results
+
+def session_predictor(metrics_input="app"):
+    """Función de inferencia ligada al modelo de la sesión, utilizable desde hilos sin acceso a la sesión"""
+    model_name = st.session_state.model_name
+    use_scheduler = st.session_state.get('use_scheduler', False)
+    
+    def predict(source, **kwargs):
+        return predict_with_model(model_name, source, use_scheduler=use_scheduler, metrics_input=metrics_input,
+                                  **kwargs)
+    
+    return predict
+
+def run_inference(source, metrics_input="app", **kwargs):
+    """Ejecutar inferencia con el modelo de la sesión usando la caché compartida"""
+    return session_predictor(metrics_input)(source, **kwargs)
+
+def detect_image(image, confidence, iou, metrics_input="app"):
+    """Detectar objetos en una imagen BGR usando la caché de resultados"""
+    return cached_predict(session_predictor(metrics_input), st.session_state.model_name, image, confidence, iou)
+
+def open_image(uploaded_file, metrics_input, target_size=MODEL_IMGSZ):
+    """Decodificar una imagen subida directamente a BGR; devuelve (imagen, factor de reducción)"""
+    with get_metrics().time("decode", metrics_input):
+        # getbuffer no copia los bytes subidos; los JPEG muy grandes se decodifican ya reducidos
+        image, factor, size = decode_image(uploaded_file.getbuffer(), target_size)
+    if factor > 1:
+        st.caption(f"Decodificada a 1/{factor}: {image.shape[1]}×{image.shape[0]} de {size[0]}×{size[1]} "
+                   "(coordenadas en la resolución original)")
+    return image, factor
+
+def show_annotated(result, metrics_input):
+    """Dibujar las detecciones y mostrarlas midiendo anotación y codificación"""
+    metrics = get_metrics()
+    with metrics.time("annotate", metrics_input):
+        # Buffer reutilizable: st.image codifica la imagen antes de la siguiente llamada
+        annotated_image = render_result(result, reuse_buffer=True)
+    with metrics.time("encode", metrics_input):
+        st.image(annotated_image, channels="BGR", use_container_width=True)
+
+def show_detection_table(result, scale=1):
+    """Tabla de detecciones construida a partir de los arrays del resultado"""
+    data = results_to_array(result)
+    # Imágenes decodificadas reducidas: coordenadas en la resolución original
+    data[:, :4] *= scale
+    st.dataframe(detection_rows(data, result.names), hide_index=True, use_container_width=True)
+
+def get_spooled_upload(uploaded_file):
+    """Obtener la ruta en disco de un archivo subido, escribiéndolo solo la primera vez"""
+    if 'spooled_uploads' not in st.session_state:
+        st.session_state.spooled_uploads = {}
+        cleanup_uploads()
+    
+    upload_key = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    path = st.session_state.spooled_uploads.get(upload_key)
+    if path is None or not os.path.exists(path):
+        path = spool_upload(uploaded_file)
+        st.session_state.spooled_uploads[upload_key] = path
+    return path
+
 def handle_image_input(confidence, iou):
     """Manejar entrada de imagen"""
     st.subheader("📸 Detección en Imagen")
     
+    mode = st.radio(
+        "Modo",
+        ["Imagen individual", "Lote de imágenes", "Imagen grande (teselas)"],
+        horizontal=True,
+        help="El modo lote procesa muchas imágenes juntas en una sola pasada del modelo por lote; "
+             "el modo teselas detecta objetos pequeños en imágenes de alta resolución"
+    )
+    if mode == "Lote de imágenes":
+        handle_image_batch(confidence, iou)
+        return
+    if mode == "Imagen grande (teselas)":
+        handle_tiled_image(confidence, iou)
+        return
+    
     uploaded_file = st.file_uploader(
         "Seleccionar imagen",
         type=['png', 'jpg', 'jpeg'],
@@ -188,7 +487,7 @@ def handle_image_input(confidence, iou):
     )
     
     if uploaded_file is not None:
-        if st.session_state.model is None:
+        if st.session_state.model_name is None:
             st.warning("⚠️ Por favor, espera a que se cargue el modelo")
             return
         
@@ -197,8 +496,8 @@ def handle_image_input(confidence, iou):
         
         with col1:
             st.subheader("Original")
-            image = Image.open(uploaded_file)
-            st.image(image, use_container_width=True)
+            image, factor = open_image(uploaded_file, "imagen")
+            st.image(image, channels="BGR", use_container_width=True)
         
         with col2:
             st.subheader("Detecciones")
@@ -206,13 +505,13 @@ def handle_image_input(confidence, iou):
             if st.button("🔍 Detectar Objetos", type="primary"):
                 with st.spinner("Procesando imagen..."):
                     try:
-                        # Ejecutar inferencia
-                        results = st.session_state.model(image, conf=confidence, iou=iou, device='cpu')
+                        # Ejecutar inferencia (reutilizando resultados en caché)
+                        results, from_cache = detect_image(image, confidence, iou, "imagen")
+                        if from_cache:
+                            st.caption("⚡ Resultado desde caché")
                         
                         # Mostrar imagen con detecciones
-                        annotated_image = results[0].plot()
-                        annotated_pil = Image.fromarray(annotated_image)
-                        st.image(annotated_pil, use_container_width=True)
+                        show_annotated(results[0], "imagen")
                         
                         # Mostrar resultados
                         if len(results[0].boxes) > 0:
@@ -220,17 +519,160 @@ def handle_image_input(confidence, iou):
                             
                             # Detalles de detección
                             with st.expander("Detalles de Detección"):
-                                for i, box in enumerate(results[0].boxes):
-                                    class_id = int(box.cls[0])
-                                    conf = float(box.conf[0])
-                                    class_name = results[0].names[class_id]
-                                    st.write(f"**{i+1}.** {class_name} - Confianza: {conf:.2f}")
+                                show_detection_table(results[0], factor)
                         else:
                             st.info("No se detectaron objetos")
                             
                     except Exception as e:
                         st.error(f"❌ Error procesando imagen: {str(e)}")
 
+def handle_image_batch(confidence, iou):
+    """Manejar entrada de múltiples imágenes procesadas por lotes"""
+    uploaded_files = st.file_uploader(
+        "Seleccionar imágenes o archivos zip",
+        type=['png', 'jpg', 'jpeg', 'zip'],
+        accept_multiple_files=True,
+        help="Sube varias imágenes o un zip con imágenes"
+    )
+    folder = ""
+    if SERVER_MEDIA_ROOT:
+        folder = st.text_input(
+            "📁 O carpeta del servidor",
+            value="",
+            help=f"Ruta relativa a {SERVER_MEDIA_ROOT} con imágenes"
+        )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_size = st.slider("📦 Imágenes por lote", min_value=1, max_value=64, value=8)
+    with col2:
+        imgsz = st.select_slider("📐 Tamaño de entrada", options=[320, 416, 512, 640, 960, 1280], value=640)
+    
+    if not uploaded_files and not folder:
+        return
+    
+    if st.session_state.model_name is None:
+        st.warning("⚠️ Por favor, espera a que se cargue el modelo")
+        return
+    
+    if folder:
+        resolved = resolve_server_path(folder)
+        if resolved is None:
+            st.error(f"❌ La carpeta debe estar dentro de {SERVER_MEDIA_ROOT}")
+            return
+        if not os.path.isdir(resolved):
+            st.error(f"❌ La carpeta no existe: {folder}")
+            return
+        folder = resolved
+    
+    if st.button("🔍 Detectar Objetos en Lote", type="primary"):
+        if uploaded_files:
+            images = iter_uploaded_images(uploaded_files)
+        else:
+            images = iter_folder_images(folder)
+        
+        progress = st.empty()
+        records = []
+        with st.spinner("Procesando imágenes..."):
+            try:
+                for record in run_batches(images, session_predictor("lote"), batch_size=batch_size, imgsz=imgsz,
+                                          keep_annotated=4, conf=confidence, iou=iou):
+                    records.append(record)
+                    progress.text(f"Imágenes procesadas: {len(records)}")
+            except Exception as e:
+                st.error(f"❌ Error procesando imágenes: {str(e)}")
+        st.session_state.batch_records = records
+    
+    records = st.session_state.get('batch_records')
+    if records:
+        total = sum(len(r['detections']) for r in records)
+        st.success(f"✅ {len(records)} imágenes procesadas, {total} objetos detectados")
+        st.dataframe(summary_rows(records), use_container_width=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("⬇️ Exportar CSV", data=to_csv(records), file_name="detecciones.csv", mime="text/csv")
+        with col2:
+            st.download_button("⬇️ Exportar JSON", data=to_json(records), file_name="detecciones.json",
+                               mime="application/json")
+        
+        previews = [r for r in records if 'annotated' in r]
+        if previews:
+            with st.expander("Vista previa"):
+                for record in previews:
+                    st.image(record['annotated'], channels="BGR", caption=record['file'],
+                             use_container_width=True)
+
+def handle_tiled_image(confidence, iou):
+    """Detección por teselas solapadas en imágenes de alta resolución (aéreas, CCTV)"""
+    uploaded_file = st.file_uploader(
+        "Seleccionar imagen de alta resolución",
+        type=['png', 'jpg', 'jpeg', 'tif', 'tiff', 'bmp'],
+        help="La imagen se divide en teselas que se procesan a resolución completa"
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        tile_size = st.select_slider("📐 Tamaño de tesela", options=[320, 416, 512, 640, 960, 1280], value=640)
+        batch_size = st.slider("📦 Teselas por lote", min_value=1, max_value=32, value=8)
+    with col2:
+        overlap = st.slider("🔲 Solape entre teselas", min_value=0.0, max_value=0.5, value=0.2, step=0.05)
+        workers = st.slider(
+            "🧵 Lotes en paralelo",
+            min_value=1,
+            max_value=max(2, runtime_config.CPU_COUNT),
+            value=min(2, runtime_config.CPU_COUNT),
+            help="Aprovecha varias réplicas del modelo (ver 🧵 Hilos de CPU)"
+        )
+    include_full = st.checkbox(
+        "Incluir pasada de la imagen completa",
+        value=True,
+        help="Detecta también los objetos grandes que no caben en una tesela"
+    )
+    
+    if uploaded_file is None:
+        return
+    
+    if st.session_state.model_name is None:
+        st.warning("⚠️ Por favor, espera a que se cargue el modelo")
+        return
+    
+    with get_metrics().time("decode", "teselas"):
+        image = decode_image_bytes(uploaded_file.getbuffer())
+    st.caption(f"Resolución: {image.shape[1]}×{image.shape[0]}")
+    
+    if st.button("🔍 Detectar Objetos por Teselas", type="primary"):
+        with st.spinner("Procesando teselas..."):
+            try:
+                data, names, info = tiled_predict(
+                    image,
+                    session_predictor("teselas"),
+                    conf=confidence,
+                    iou=iou,
+                    tile_size=tile_size,
+                    overlap=overlap,
+                    batch_size=batch_size,
+                    workers=workers,
+                    include_full=include_full,
+                )
+            except Exception as e:
+                st.error(f"❌ Error procesando imagen: {str(e)}")
+                return
+        
+        with get_metrics().time("annotate", "teselas"):
+            annotated_image = draw_detections(image, data, names)
+        with get_metrics().time("encode", "teselas"):
+            st.image(annotated_image, channels="BGR", use_container_width=True)
+        st.caption(f"{info['tiles']} teselas en {info['batches']} lotes · {info['candidates']} candidatas · "
+                   f"{info['seconds']:.1f}s")
+        
+        if len(data) > 0:
+            st.success(f"✅ Detectados {len(data)} objetos")
+            with st.expander("Detalles de Detección"):
+                st.dataframe(detection_rows(data, names), hide_index=True, use_container_width=True)
+        else:
+            st.info("No se detectaron objetos")
+
 def handle_video_input(confidence, iou):
     """Manejar entrada de video"""
     st.subheader("📹 Detección en Video")
@@ -242,32 +684,152 @@ def handle_video_input(confidence, iou):
     )
     
     if uploaded_file is not None:
-        if st.session_state.model is None:
+        if st.session_state.model_name is None:
             st.warning("⚠️ Por favor, espera a que se cargue el modelo")
             return
         
-        # Guardar archivo temporalmente
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            temp_path = tmp_file.name
+        # Guardar el archivo en disco una sola vez (reutilizado entre reruns)
+        try:
+            temp_path = get_spooled_upload(uploaded_file)
+        except Exception as e:
+            st.error(f"❌ Error guardando el archivo: {str(e)}")
+            return
         
         st.success(f"✅ Archivo subido: {uploaded_file.name}")
         
-        if st.button("🎬 Procesar Video", type="primary"):
-            with st.spinner("Procesando video..."):
-                try:
-                    # Ejecutar inferencia en video
-                    results = st.session_state.model(temp_path, conf=confidence, iou=iou, save=True, device='cpu')
-                    
-                    st.success("✅ ¡Video procesado exitosamente!")
-                    st.info("🎥 El video con detecciones se ha guardado en la carpeta 'runs'")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error al procesar el video: {str(e)}")
-                finally:
-                    # Limpiar archivo temporal
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
+        batch_size = st.slider(
+            "📦 Frames por lote",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="Frames que se procesan juntos en cada pasada del modelo; la memoria usada depende solo de este valor"
+        )
+        
+        workers = st.slider(
+            "🧵 Hilos de trabajo",
+            min_value=1,
+            max_value=max(2, os.cpu_count() or 1),
+            value=min(DEFAULT_WORKERS, max(2, os.cpu_count() or 1)),
+            help="Hilos para inferencia y anotación; la decodificación y la escritura usan su propio hilo"
+        )
+        
+        detect_every, scene_threshold = tracking_controls("video")
+        
+        if st.button("🎬 Encolar Video", type="primary"):
+            # El video se procesa en segundo plano: la página sigue respondiendo y se puede recargar
+            try:
+                job = get_job_manager().submit(
+                    temp_path,
+                    st.session_state.model_name,
+                    params={'conf': confidence, 'iou': iou},
+                    options={
+                        'batch_size': batch_size,
+                        'workers': workers,
+                        'detect_every': detect_every,
+                        'scene_threshold': scene_threshold,
+                    },
+                    name=uploaded_file.name,
+                )
+            except Exception as e:
+                st.error(f"❌ Error al encolar el video: {str(e)}")
+            else:
+                # Guardar el ID en la URL para recuperar el trabajo tras recargar la página
+                st.query_params["job"] = st.query_params.get_all("job") + [job['job_id']]
+                st.success("✅ Video en cola")
+    
+    job_ids = st.query_params.get_all("job")
+    if job_ids:
+        manager = get_job_manager()
+        jobs = [job for job in (manager.get(job_id) for job_id in reversed(job_ids)) if job is not None]
+        st.session_state.jobs_finished = [job['job_id'] for job in jobs if job['status'] in FINISHED]
+        active = len(st.session_state.jobs_finished) < len(jobs)
+        # Refrescar solo la lista de trabajos cada segundo mientras quede alguno en marcha
+        st.fragment(run_every=1.0 if active else None)(show_video_jobs)(job_ids)
+        # Las descargas quedan fuera del fragmento: el video no se vuelve a leer en cada refresco
+        show_job_downloads(jobs)
+
+def format_eta(seconds):
+    """Tiempo restante legible"""
+    if seconds is None:
+        return "calculando..."
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def show_video_jobs(job_ids):
+    """Trabajos de video de esta página con progreso y cancelación"""
+    manager = get_job_manager()
+    st.markdown("#### 🗂️ Trabajos de video")
+    labels = {'queued': "⏳ En cola", 'running': "⚙️ Procesando", 'done': "✅ Terminado",
+              'error': "❌ Error", 'cancelled': "🚫 Cancelado"}
+    
+    jobs = [job for job in (manager.get(job_id) for job_id in reversed(job_ids)) if job is not None]
+    for job in jobs:
+        status = job['status']
+        with st.container(border=True):
+            st.write(f"**{job['name']}** · {labels.get(status, status)}")
+            
+            if status in ('queued', 'running'):
+                total = job.get('total_frames') or 0
+                st.progress(min(job['frames'] / total, 1.0) if total else 0.0)
+                if status == 'running':
+                    frames = f"{job['frames']}/{total}" if total else f"{job['frames']}"
+                    st.caption(f"Frame {frames} - {job.get('fps', 0):.1f} FPS - quedan {format_eta(job.get('eta_s'))}")
+                if st.button("🛑 Cancelar", key=f"cancel_{job['job_id']}"):
+                    manager.cancel(job['job_id'])
+                    st.rerun()
+            
+            elif status == 'done':
+                summary = job.get('summary', {})
+                st.caption(f"{summary.get('frames', job['frames'])} frames en {summary.get('seconds', 0):.1f}s")
+                if 'detected_frames' in summary:
+                    st.caption(f"Detector ejecutado en {summary['detected_frames']} de {summary['frames']} frames")
+                if summary.get('unique_objects'):
+                    with st.expander("Objetos Únicos (seguimiento)"):
+                        for class_name, count in summary['unique_objects'].items():
+                            st.write(f"**{class_name}**: {count}")
+                elif summary.get('detections'):
+                    with st.expander("Resumen de Detecciones"):
+                        for class_name, count in sorted(summary['detections'].items(), key=lambda x: -x[1]):
+                            st.write(f"**{class_name}**: {count}")
+            
+            elif status == 'error':
+                st.error(f"❌ Error al procesar el video: {job.get('error')}")
+    
+    # Al terminar un trabajo, volver a ejecutar la página completa: muestra su descarga y deja de
+    # refrescar cuando ya no queda ninguno en marcha
+    finished = [job['job_id'] for job in jobs if job['status'] in FINISHED]
+    if finished != st.session_state.get('jobs_finished', finished):
+        st.rerun()
+
+def show_job_downloads(jobs):
+    """Botones de descarga de los trabajos terminados (fuera del fragmento que se refresca)"""
+    for job in jobs:
+        if job['status'] == 'done' and os.path.exists(job['output_path']):
+            with open(job['output_path'], 'rb') as f:
+                st.download_button(
+                    f"⬇️ Descargar {job['name']} procesado",
+                    data=f,
+                    file_name=f"{os.path.splitext(job['name'])[0]}_detecciones.mp4",
+                    mime="video/mp4",
+                    key=f"download_{job['job_id']}"
+                )
+
+def tracking_controls(key):
+    """Controles de detección cada K frames con seguimiento: (K, umbral de cambio de escena)"""
+    detect_every = st.slider(
+        "🎯 Detectar cada K frames",
+        min_value=1,
+        max_value=15,
+        value=1,
+        key=f"detect_every_{key}",
+        help="Con K > 1 el detector solo corre en uno de cada K frames y un seguimiento ligero mueve las cajas "
+             "en el resto, con IDs persistentes y recuento de objetos únicos"
+    )
+    scene_threshold = 0
+    if detect_every > 1:
+        if st.checkbox("Detectar también tras un cambio de escena", value=True, key=f"scene_change_{key}"):
+            scene_threshold = SCENE_THRESHOLD
+    return detect_every, scene_threshold
 
 def init_camera():
     """Inicializar la cámara con múltiples métodos"""
@@ -279,6 +841,7 @@ def init_camera():
             if ret and frame is not None:
                 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 return cap, "✅ Cámara principal inicializada"
             cap.release()
         
@@ -290,6 +853,7 @@ def init_camera():
                 if ret and frame is not None:
                     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                     return cap, f"✅ Cámara {i} inicializada"
                 cap.release()
         
@@ -303,6 +867,7 @@ def init_camera():
                     if ret and frame is not None:
                         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                         return cap, f"✅ Cámara inicializada con backend {backend}"
                     cap.release()
             except:
@@ -312,11 +877,126 @@ def init_camera():
     except Exception as e:
         return None, f"❌ Error al inicializar la cámara: {str(e)}"
 
+def open_server_source(source_type, video_path):
+    """Abrir la fuente de captura del servidor: (cap, fps_de_reproducción, mensaje)"""
+    if source_type == "Cámara conectada al servidor":
+        cap, message = init_camera()
+        return cap, None, message
+    if source_type == "Archivo de video del servidor":
+        resolved = resolve_server_path(video_path)
+        if resolved is None:
+            return None, None, f"❌ El video debe estar dentro de {SERVER_MEDIA_ROOT}"
+        if not os.path.isfile(resolved):
+            return None, None, f"❌ No existe el archivo: {video_path}"
+        cap = cv2.VideoCapture(resolved)
+        if not cap.isOpened():
+            return None, None, f"❌ No se pudo abrir el video: {video_path}"
+        return cap, cap.get(cv2.CAP_PROP_FPS) or 30.0, f"✅ Video abierto: {video_path}"
+    return SyntheticFrameSource(), None, "✅ Fuente sintética inicializada"
+
+def stop_server_capture():
+    """Detener el lector de la cámara del servidor de la sesión"""
+    handle = st.session_state.get('server_capture')
+    if handle is not None:
+        handle.stop()
+    st.session_state.server_capture = None
+    stop_stream_worker()
+
+def handle_server_camera(confidence, iou):
+    """Captura continua desde una cámara conectada al servidor (equipos edge sin navegador)"""
+    st.subheader("🖥️ Detección con Cámara del Servidor")
+    
+    if st.session_state.model_name is None:
+        st.warning("⚠️ Por favor, espera a que se cargue el modelo")
+        return
+    
+    st.info("""
+    🖥️ **Captura en el servidor:**
+    - Un hilo lector mantiene solo el frame más reciente de la cámara
+    - La detección corre en segundo plano sobre ese frame
+    - Se muestran FPS de captura, FPS de inferencia y latencia
+    """)
+    
+    # Los archivos de video solo se ofrecen dentro de la carpeta configurada por el operador
+    sources = ["Cámara conectada al servidor", "Fuente sintética (prueba)"]
+    if SERVER_MEDIA_ROOT:
+        sources.insert(1, "Archivo de video del servidor")
+    source_type = st.radio("Fuente de captura", sources, horizontal=True)
+    video_path = ""
+    if source_type == "Archivo de video del servidor":
+        video_path = st.text_input("📁 Ruta del video en el servidor", value="",
+                                   help=f"Ruta relativa a {SERVER_MEDIA_ROOT}")
+    
+    detect_every, scene_threshold = tracking_controls("servidor")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        start_button = st.button("🚀 Iniciar Captura", type="primary")
+    with col2:
+        stop_button = st.button("⏹️ Detener Captura", type="secondary")
+    
+    if stop_button:
+        stop_server_capture()
+        st.success("📷 Captura detenida")
+    
+    if start_button:
+        stop_server_capture()
+        cap, pace_fps, message = open_server_source(source_type, video_path)
+        if cap is None:
+            st.error(message)
+            return
+        st.success(message)
+        worker = get_stream_worker(confidence, iou, "servidor", detect_every, scene_threshold)
+        # Si la sesión se cierra sin detener la captura, el lector se detiene y libera la fuente igualmente
+        st.session_state.server_capture = SessionResource(
+            LatestFrameReader(cap, on_frame=worker.submit, pace_fps=pace_fps))
+    
+    handle = st.session_state.get('server_capture')
+    if handle is None:
+        return
+    reader = handle.resource
+    
+    # Si cambia el modelo el worker se reemplaza: el lector pasa a entregarle los frames al nuevo
+    worker = get_stream_worker(confidence, iou, "servidor", detect_every, scene_threshold)
+    reader.on_frame = worker.submit
+    
+    frame_slot = st.empty()
+    stats_slot = st.empty()
+    # El bucle termina al detener la captura (el botón provoca un rerun) o al acabar la fuente
+    while True:
+        output = worker.latest()
+        if output is not None:
+            with get_metrics().time("encode", "servidor"):
+                frame_slot.image(output[0], channels="BGR", use_container_width=True)
+        capture_stats = reader.stats()
+        stats = worker.stats()
+        unique = st.session_state.stream_params.get('unique')
+        with stats_slot.container():
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("FPS captura", f"{capture_stats['fps']:.1f}")
+            with col2:
+                st.metric("FPS inferencia", f"{stats['fps']:.1f}")
+            with col3:
+                st.metric("Latencia", f"{stats['latency_ms']:.0f} ms")
+            with col4:
+                st.metric("Frames descartados", stats['dropped'])
+            if unique:
+                st.caption("Objetos únicos: " + ", ".join(f"{name}×{n}" for name, n in unique.items()))
+        if reader.finished:
+            if reader.error is not None:
+                st.error(f"❌ Error leyendo la fuente: {str(reader.error)}")
+            else:
+                st.info("La fuente no tiene más frames")
+            stop_server_capture()
+            break
+        time.sleep(0.1)
+
 def handle_camera_capture(confidence, iou):
     """Capturar imagen desde la cámara web usando Streamlit"""
     st.subheader("📸 Captura de Imagen desde Cámara")
     
-    if st.session_state.model is None:
+    if st.session_state.model_name is None:
         st.warning("⚠️ Por favor, espera a que se cargue el modelo")
         return
     
@@ -332,13 +1012,13 @@ def handle_camera_capture(confidence, iou):
     
     if camera_image is not None:
         # Convertir la imagen capturada
-        image = Image.open(camera_image)
+        image, factor = open_image(camera_image, "captura")
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Imagen Original")
-            st.image(image, use_container_width=True)
+            st.image(image, channels="BGR", use_container_width=True)
         
         with col2:
             st.subheader("Detecciones")
@@ -346,13 +1026,13 @@ def handle_camera_capture(confidence, iou):
             if st.button("🔍 Detectar Objetos", type="primary", key="detect_camera"):
                 with st.spinner("Procesando imagen capturada..."):
                     try:
-                        # Ejecutar inferencia
-                        results = st.session_state.model(image, conf=confidence, iou=iou, device='cpu')
+                        # Ejecutar inferencia (reutilizando resultados en caché)
+                        results, from_cache = detect_image(image, confidence, iou, "captura")
+                        if from_cache:
+                            st.caption("⚡ Resultado desde caché")
                         
                         # Mostrar imagen con detecciones
-                        annotated_image = results[0].plot()
-                        annotated_pil = Image.fromarray(annotated_image)
-                        st.image(annotated_pil, use_container_width=True)
+                        show_annotated(results[0], "captura")
                         
                         # Mostrar resultados
                         if len(results[0].boxes) > 0:
@@ -360,29 +1040,274 @@ def handle_camera_capture(confidence, iou):
                             
                             # Detalles de detección
                             with st.expander("Detalles de Detección"):
-                                for i, box in enumerate(results[0].boxes):
-                                    class_id = int(box.cls[0])
-                                    conf = float(box.conf[0])
-                                    class_name = results[0].names[class_id]
-                                    st.write(f"**{i+1}.** {class_name} - Confianza: {conf:.2f}")
+                                show_detection_table(results[0], factor)
                         else:
                             st.info("No se detectaron objetos")
                             
                     except Exception as e:
                         st.error(f"❌ Error procesando imagen: {str(e)}")
 
+def make_stream_processor(model_name, params):
+    """Función de inferencia para el worker de streaming (sin acceso a la sesión)"""
+    state = {'tracked': None, 'names': {}}
+    
+    def detect(frame):
+        controller = params.get('adaptive')
+        if controller is None:
+            results = predict_with_model(model_name, frame, use_scheduler=params['use_scheduler'],
+                                         metrics_input=params['metrics_input'], conf=params['conf'], iou=params['iou'])
+        else:
+            results = adaptive_predict(controller, frame, use_scheduler=params['use_scheduler'],
+                                       metrics_input=params['metrics_input'], conf=params['conf'], iou=params['iou'])
+        state['names'] = results[0].names
+        return results[0]
+    
+    def process(frame):
+        if params['detect_every'] <= 1:
+            state['tracked'] = None
+            result = detect(frame)
+            with get_metrics().time("annotate", params['metrics_input']):
+                annotated = render_result(result)
+            return annotated, result
+        
+        # Detector cada K frames y seguimiento en el resto; se reinicia si cambian los ajustes
+        settings = (params['detect_every'], params['scene_threshold'])
+        tracked = state['tracked']
+        if tracked is None or state.get('settings') != settings:
+            tracked = TrackedDetector(*settings)
+            state['tracked'], state['settings'] = tracked, settings
+        tracks, _ = tracked.step(frame, lambda f: results_to_array(detect(f)))
+        params['unique'] = tracked.tracker.unique_counts(state['names'])
+        with get_metrics().time("annotate", params['metrics_input']):
+            annotated = draw_detections(frame, tracks, state['names'])
+        return annotated, tracks
+    
+    return process
+
+def get_stream_worker(confidence, iou, metrics_input="webcam", detect_every=1, scene_threshold=0, adaptive=None):
+    """Obtener el worker de streaming de la sesión, recreándolo si cambia el modelo"""
+    if 'stream_params' not in st.session_state:
+        st.session_state.stream_params = {}
+    params = st.session_state.stream_params
+    params.update(conf=confidence, iou=iou, use_scheduler=st.session_state.get('use_scheduler', False),
+                  metrics_input=metrics_input, detect_every=detect_every, scene_threshold=scene_threshold,
+                  adaptive=adaptive)
+    if detect_every <= 1:
+        params.pop('unique', None)
+    
+    handle = st.session_state.get('stream_worker')
+    if handle is None or st.session_state.get('stream_worker_model') != st.session_state.model_name:
+        # Detener el worker anterior antes de reemplazarlo; el de la sesión se detiene también al cerrarla
+        stop_stream_worker()
+        worker = LatestFrameWorker(make_stream_processor(st.session_state.model_name, params))
+        handle = SessionResource(worker)
+        st.session_state.stream_worker = handle
+        st.session_state.stream_worker_model = st.session_state.model_name
+    return handle.resource
+
+def stop_stream_worker():
+    """Detener el worker de streaming de la sesión, si existe"""
+    handle = st.session_state.get('stream_worker')
+    if handle is not None:
+        handle.stop()
+    st.session_state.stream_worker = None
+    st.session_state.stream_worker_model = None
+
+def show_stream_stats(container, stats, unique=None, adaptive=None):
+    """Mostrar FPS, latencia, frames descartados, objetos únicos y nivel de calidad adaptativa del streaming"""
+    with container.container():
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Frames procesados", stats['processed'])
+        with col2:
+            st.metric("FPS inferencia", f"{stats['fps']:.1f}")
+        with col3:
+            st.metric("Latencia", f"{stats['latency_ms']:.0f} ms")
+        with col4:
+            st.metric("Frames descartados", stats['dropped'])
+        if unique:
+            st.caption("Objetos únicos: " + ", ".join(f"{name}×{n}" for name, n in unique.items()))
+        if adaptive is not None:
+            show_adaptive_state(adaptive)
+
+def adaptive_controls(key):
+    """Controles de calidad adaptativa; devuelve el controlador de la sesión o None si está desactivada"""
+    controller_key = f"adaptive_controller_{key}"
+    if not st.checkbox(
+        "🎚️ Calidad adaptativa",
+        key=f"adaptive_{key}",
+        help="Mide la latencia de cada frame y cambia el tamaño de YOLO11 y la resolución de entrada "
+             "para mantenerse dentro del objetivo"
+    ):
+        st.session_state.pop(controller_key, None)
+        return None
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        objective = st.radio("Objetivo", ["Latencia por frame", "FPS"], horizontal=True, key=f"adaptive_objective_{key}")
+        if objective == "FPS":
+            value = st.slider("FPS objetivo", min_value=1, max_value=30, value=5, key=f"adaptive_fps_{key}")
+        else:
+            value = st.slider("Latencia objetivo (ms)", min_value=50, max_value=2000, value=300, step=50,
+                              key=f"adaptive_ms_{key}")
+    with col2:
+        max_weights = st.select_slider(
+            "Modelo más grande permitido",
+            options=list(MODEL_OPTIONS.values()),
+            value="yolo11s.pt",
+            key=f"adaptive_max_{key}",
+            help="Los modelos se cargan la primera vez que se usan; los grandes tardan más en descargarse"
+        )
+    st.caption("El modo adaptativo usa los pesos PyTorch (.pt): el backend de la barra lateral no se aplica")
+    
+    # El controlador conserva lo aprendido entre reruns mientras no cambien los ajustes
+    settings = (objective, value, max_weights)
+    stored = st.session_state.get(controller_key)
+    if stored is None or stored[0] != settings:
+        ladder = quality_ladder(max_weights)
+        controller = (AdaptiveController.for_fps(value, ladder=ladder) if objective == "FPS"
+                      else AdaptiveController(value, ladder=ladder))
+        stored = (settings, controller)
+        st.session_state[controller_key] = stored
+    return stored[1]
+
+def adaptive_predict(controller, source, metrics_input="webcam", use_scheduler=False, **kwargs):
+    """Inferencia con el modelo e imgsz que indique el controlador, registrando la latencia medida"""
+    level, weights, imgsz = controller.current()
+    # Cargar el modelo fuera de la medición: la primera carga no debe contar como latencia
+    get_registry().get(weights, device='cpu')
+    start = time.perf_counter()
+    results = predict_with_model(weights, source, use_scheduler=use_scheduler, metrics_input=metrics_input,
+                                 imgsz=imgsz, **kwargs)
+    controller.observe((time.perf_counter() - start) * 1000, level)
+    return results
+
+def show_adaptive_state(controller):
+    """Nivel de calidad actual frente al objetivo"""
+    state = controller.state()
+    latency = f"{state['latencia_ms']:.0f} ms" if state['latencia_ms'] is not None else "midiendo..."
+    st.caption(f"🎚️ Nivel {state['nivel']}: {state['modelo']} a {state['imgsz']} px · {latency} "
+               f"(objetivo {state['objetivo_ms']:.0f} ms) · {state['cambios']} cambios")
+
 def handle_webcam_input(confidence, iou):
-    """Manejar entrada de cámara web en tiempo real con streaming automático"""
+    """Manejar entrada de cámara web en tiempo real con streaming continuo"""
     st.subheader("📷 Detección en Cámara Web - Streaming Continuo")
     
-    if st.session_state.model is None:
+    if st.session_state.model_name is None:
         st.warning("⚠️ Por favor, espera a que se cargue el modelo")
         return
     
+    stream_modes = ["Capturas periódicas", "Fuente sintética (prueba)"]
+    if WEBRTC_AVAILABLE:
+        stream_modes.insert(0, "Cámara del navegador (WebRTC)")
+    
+    stream_mode = st.radio(
+        "Modo de streaming",
+        stream_modes,
+        horizontal=True,
+        help="WebRTC envía frames continuamente; la fuente sintética permite probar el streaming sin cámara"
+    )
+    
+    if not WEBRTC_AVAILABLE:
+        st.caption("💡 Instala `streamlit-webrtc` para streaming continuo desde la cámara del navegador")
+    
+    if stream_mode == "Cámara del navegador (WebRTC)":
+        handle_webrtc_stream(confidence, iou, *tracking_controls("webcam"), adaptive=adaptive_controls("webcam"))
+    elif stream_mode == "Fuente sintética (prueba)":
+        handle_synthetic_stream(confidence, iou, *tracking_controls("webcam"), adaptive=adaptive_controls("webcam"))
+    else:
+        stop_stream_worker()
+        handle_webcam_snapshots(confidence, iou, adaptive=adaptive_controls("snapshots"))
+
+def handle_webrtc_stream(confidence, iou, detect_every=1, scene_threshold=0, adaptive=None):
+    """Streaming continuo por WebRTC con inferencia en segundo plano"""
+    st.info("""
+    🎥 **Streaming continuo por WebRTC:**
+    - Los frames de la cámara se envían sin recargar la página
+    - La inferencia corre en segundo plano sobre el frame más reciente
+    - Si la inferencia se atrasa, los frames intermedios se descartan para mantener baja la latencia
+    """)
+    
+    # El worker solo existe mientras la transmisión está activa
+    current = {}
+    
+    def video_frame_callback(frame):
+        image = frame.to_ndarray(format="bgr24")
+        worker = current.get('worker')
+        if worker is None:
+            return frame
+        worker.submit(image)
+        output = worker.latest()
+        annotated = output[0] if output is not None else image
+        with get_metrics().time("encode", "webcam"):
+            return av.VideoFrame.from_ndarray(annotated, format="bgr24")
+    
+    ctx = webrtc_streamer(
+        key="yolo-webrtc",
+        mode=WebRtcMode.SENDRECV,
+        video_frame_callback=video_frame_callback,
+        media_stream_constraints={"video": True, "audio": False},
+        async_processing=True,
+    )
+    
+    if not ctx.state.playing:
+        stop_stream_worker()
+        return
+    
+    worker = get_stream_worker(confidence, iou, "webcam", detect_every, scene_threshold, adaptive)
+    current['worker'] = worker
+    stats_slot = st.empty()
+    while ctx.state.playing:
+        show_stream_stats(stats_slot, worker.stats(), st.session_state.stream_params.get('unique'), adaptive)
+        time.sleep(1.0)
+
+def handle_synthetic_stream(confidence, iou, detect_every=1, scene_threshold=0, adaptive=None):
+    """Probar el streaming continuo con una fuente de frames sintética local"""
+    st.info("""
+    🧪 **Fuente sintética:**
+    - Genera frames localmente a 30 FPS sin necesidad de cámara
+    - Usa el mismo worker de inferencia que el streaming WebRTC
+    - Útil para medir FPS, latencia y descarte de frames en este servidor
+    """)
+    
+    duration = st.slider("⏱️ Duración de la prueba (segundos)", min_value=5, max_value=60, value=10)
+    
+    if st.button("▶️ Iniciar prueba", type="primary"):
+        worker = get_stream_worker(confidence, iou, "webcam", detect_every, scene_threshold, adaptive)
+        source = SyntheticFrameSource()
+        frame_slot = st.empty()
+        stats_slot = st.empty()
+        end_time = time.time() + duration
+        last_stats = 0
+        try:
+            while time.time() < end_time:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                worker.submit(frame)
+                output = worker.latest()
+                if output is not None:
+                    with get_metrics().time("encode", "webcam"):
+                        frame_slot.image(output[0], channels="BGR", use_container_width=True)
+                if time.time() - last_stats >= 0.5:
+                    show_stream_stats(stats_slot, worker.stats(), st.session_state.stream_params.get('unique'), adaptive)
+                    last_stats = time.time()
+        finally:
+            source.release()
+            stop_stream_worker()
+        show_stream_stats(stats_slot, worker.stats(), st.session_state.stream_params.get('unique'), adaptive)
+        if worker.error is not None:
+            st.error(f"❌ Error procesando frame: {str(worker.error)}")
+
+def handle_webcam_snapshots(confidence, iou, adaptive=None):
+    """Streaming por capturas periódicas con st.camera_input"""
+    # Intervalo fijo o ajustado a la latencia medida por la calidad adaptativa
+    interval = adaptive.capture_interval() if adaptive is not None else 2.0
+    
     # Información sobre la funcionalidad
     st.info("""
     🎥 **Streaming automático en tiempo real:**
-    - Captura y procesa frames automáticamente cada 2 segundos
+    - Captura y procesa frames automáticamente cada 2 segundos (o según la calidad adaptativa)
     - Detección continua sin necesidad de presionar botones
     - Usa la cámara web del navegador
     - Compatible con Streamlit Cloud
@@ -433,9 +1358,9 @@ def handle_webcam_input(confidence, iou):
         stats_container = st.container()
         
         with stream_container:
-            # Auto-captura cada 2 segundos
+            # Auto-captura según el intervalo
             current_time = time.time()
-            if current_time - st.session_state.last_capture_time >= 2.0:
+            if current_time - st.session_state.last_capture_time >= interval:
                 st.session_state.last_capture_time = current_time
                 st.session_state.stream_frame_count += 1
                 
@@ -444,26 +1369,26 @@ def handle_webcam_input(confidence, iou):
                 
                 # Mostrar cámara para captura automática
                 camera_image = st.camera_input(
-                    f"📸 Frame #{st.session_state.stream_frame_count} - Captura automática cada 2 segundos",
+                    f"📸 Frame #{st.session_state.stream_frame_count} - Captura automática cada {interval:.1f} segundos",
                     key=camera_key,
                     help="La cámara captura automáticamente para análisis continuo"
                 )
                 
                 if camera_image is not None:
                     # Procesar la imagen capturada
-                    image = Image.open(camera_image)
+                    image, factor = open_image(camera_image, "webcam")
                     
                     # Ejecutar inferencia
                     with st.spinner("Analizando frame..."):
                         try:
-                            results = st.session_state.model(image, conf=confidence, iou=iou, device='cpu')
+                            if adaptive is not None:
+                                results = adaptive_predict(adaptive, image, conf=confidence, iou=iou,
+                                                           use_scheduler=st.session_state.get('use_scheduler', False))
+                            else:
+                                results = run_inference(image, metrics_input="webcam", conf=confidence, iou=iou)
                             
                             # Mostrar imagen con detecciones
-                            annotated_image = results[0].plot()
-                            annotated_pil = Image.fromarray(annotated_image)
-                            
-                            # Mostrar resultado
-                            st.image(annotated_pil, use_container_width=True)
+                            show_annotated(results[0], "webcam")
                             
                             # Mostrar detecciones
                             detections = len(results[0].boxes)
@@ -473,11 +1398,7 @@ def handle_webcam_input(confidence, iou):
                                 
                                 # Detalles de detección
                                 with st.expander("📋 Detalles de Detección"):
-                                    for i, box in enumerate(results[0].boxes):
-                                        class_id = int(box.cls[0])
-                                        conf = float(box.conf[0])
-                                        class_name = results[0].names[class_id]
-                                        st.write(f"**{i+1}.** {class_name} - Confianza: {conf:.2f}")
+                                    show_detection_table(results[0], factor)
                             else:
                                 st.info(f"Frame #{st.session_state.stream_frame_count}: No se detectaron objetos")
                             
@@ -498,13 +1419,15 @@ def handle_webcam_input(confidence, iou):
             with col2:
                 st.metric("Tiempo transcurrido", f"{int(time.time() - st.session_state.last_capture_time)}s")
             with col3:
-                st.metric("Intervalo", "2 segundos")
+                st.metric("Intervalo", f"{interval:.1f} segundos")
+            if adaptive is not None:
+                show_adaptive_state(adaptive)
         
         # Instrucciones
         st.markdown("---")
         st.info("""
         💡 **Streaming activo:**
-        - La cámara captura automáticamente cada 2 segundos
+        - La cámara captura automáticamente según el intervalo indicado
         - Los frames se procesan y analizan automáticamente
         - Presiona "Detener Streaming" para finalizar
         - El streaming continúa hasta que lo detengas manualmente
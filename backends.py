@@ -0,0 +1,108 @@
+"""
+Exportación de modelos a backends de CPU (ONNX Runtime, OpenVINO, TorchScript) con caché en disco
+"""
+
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+# Nombre visible -> formato de exportación (None = PyTorch sin exportar)
+BACKENDS = {
+    "PyTorch": None,
+    "ONNX Runtime": "onnx",
+    "OpenVINO": "openvino",
+    "TorchScript": "torchscript",
+    "ONNX Runtime INT8 (dinámico)": "onnx-int8-dynamic",
+    "ONNX Runtime INT8 (estático)": "onnx-int8-static",
+    "OpenVINO FP16": "openvino-fp16",
+}
+
+# Variantes cuantizadas generadas a partir del ONNX FP32
+QUANTIZED_FORMATS = ("onnx-int8-dynamic", "onnx-int8-static")
+
+EXPORT_DIR = os.environ.get("YOLO_EXPORT_DIR", "exports")
+EXPORT_IMGSZ = 640
+
+# Ultralytics exporta junto a los pesos, así que las exportaciones se serializan
+_export_lock = threading.RLock()
+
+
+def exported_path(weights, fmt, imgsz=EXPORT_IMGSZ):
+    """Ruta del artefacto exportado en la caché de disco"""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    base_fmt, _, variant = fmt.partition("-")
+    suffix = f"_{variant.replace('-', '_')}" if variant else ""
+    if base_fmt == "openvino":
+        # Ultralytics reconoce OpenVINO por el sufijo del directorio
+        return os.path.join(EXPORT_DIR, f"{stem}_{imgsz}{suffix}_openvino_model")
+    return os.path.join(EXPORT_DIR, f"{stem}_{imgsz}{suffix}.{base_fmt}")
+
+
+def export_model(weights, fmt, imgsz=EXPORT_IMGSZ):
+    """Exportar los pesos al formato indicado una sola vez y devolver la ruta del artefacto"""
+    target = exported_path(weights, fmt, imgsz)
+    if os.path.exists(target):
+        return target
+
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+
+        if fmt in QUANTIZED_FORMATS:
+            from quantization import quantize_onnx
+
+            quantize_onnx(weights, fmt, imgsz, target)
+            return target
+
+        from ultralytics import YOLO
+
+        base_fmt = fmt.partition("-")[0]
+        # Entrada dinámica para admitir lotes de varios frames e imágenes de otros tamaños
+        # (el video por lotes y el modo por lotes envían varios frames y hasta 1280 px a cualquier backend)
+        dynamic = base_fmt in ("onnx", "openvino", "torchscript")
+        output = YOLO(weights).export(format=base_fmt, imgsz=imgsz, dynamic=dynamic,
+                                      half=fmt.endswith("fp16"), device="cpu")
+        shutil.move(str(output), target)
+        return target
+
+
+def resolve_model(weights, backend, imgsz=EXPORT_IMGSZ):
+    """Obtener la ruta a cargar para un backend, exportando si hace falta"""
+    fmt = BACKENDS.get(backend)
+    if fmt is None:
+        return weights
+    return export_model(weights, fmt, imgsz)
+
+
+def benchmark_backends(weights, backends, registry, imgsz=EXPORT_IMGSZ, runs=10, warmup=2):
+    """Medir la latencia de inferencia de cada backend sobre una imagen sintética"""
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, size=(imgsz, imgsz, 3), dtype=np.uint8)
+    rows = []
+    for backend in backends:
+        try:
+            path = resolve_model(weights, backend, imgsz)
+            for _ in range(warmup):
+                registry.predict(path, image, imgsz=imgsz, verbose=False)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                registry.predict(path, image, imgsz=imgsz, verbose=False)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings = np.array(timings)
+            rows.append({
+                "backend": backend,
+                "media_ms": round(float(timings.mean()), 1),
+                "p50_ms": round(float(np.percentile(timings, 50)), 1),
+                "p95_ms": round(float(np.percentile(timings, 95)), 1),
+                "fps": round(1000 / float(timings.mean()), 1),
+                "error": "",
+            })
+        except Exception as e:
+            rows.append({"backend": backend, "media_ms": None, "p50_ms": None, "p95_ms": None, "fps": None,
+                         "error": str(e)})
+    return rows
@@ -0,0 +1,410 @@
+"""
+Detección por lotes sin interfaz sobre carpetas de imágenes y videos, con pool de procesos y reanudación
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from batch_inference import IMAGE_EXTENSIONS
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".wmv")
+
+# Columnas fijas de cada registro (una fila por imagen o por frame de video)
+RECORD_FIELDS = ("file", "frame", "width", "height", "ms", "error", "detections")
+
+# Registros por bloque: los videos se vuelcan a un archivo temporal y se copian a la salida por bloques
+CHUNK_RECORDS = 1000
+
+
+def collect_inputs(paths):
+    """Recorrer archivos y carpetas (recursivo) y separar imágenes y videos"""
+    images, videos = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            files = []
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files = [path]
+        for file in sorted(files):
+            lower = file.lower()
+            if lower.endswith(IMAGE_EXTENSIONS):
+                images.append(file)
+            elif lower.endswith(VIDEO_EXTENSIONS):
+                videos.append(file)
+    return images, videos
+
+
+def plan_tasks(images, videos, images_per_task):
+    """Dividir el trabajo: grupos de imágenes y un video por tarea"""
+    tasks = [("images", images[i:i + images_per_task]) for i in range(0, len(images), images_per_task)]
+    tasks.extend(("video", [video]) for video in videos)
+    return tasks
+
+
+# Estado de cada proceso del pool: un único modelo cargado por proceso
+_worker = {}
+
+
+def init_worker(model_path, params, threads):
+    """Cargar el modelo una vez por proceso y limitar sus hilos para no saturar la CPU"""
+    import runtime_config
+    from ultralytics import YOLO
+
+    if threads:
+        runtime_config.apply_thread_settings(intra_threads=threads)
+    _worker["model"] = YOLO(model_path, task="detect")
+    _worker["params"] = params
+
+
+def _predict(frames, **kwargs):
+    return _worker["model"](frames, device="cpu", verbose=False, **kwargs)
+
+
+def error_record(path, error):
+    """Fila de error para un archivo que no se pudo procesar"""
+    return {"file": path, "frame": None, "error": str(error), "detections": []}
+
+
+def run_task(kind, paths, spool_dir):
+    """Procesar una tarea en el proceso del pool: registros de las imágenes o archivo temporal del video"""
+    params = _worker["params"]
+    if kind == "images":
+        from batch_inference import run_batches
+
+        def read(paths):
+            for path in paths:
+                with open(path, "rb") as f:
+                    yield path, f.read()
+
+        def process(paths):
+            return list(run_batches(read(paths), _predict, batch_size=params["batch_size"], imgsz=params["imgsz"],
+                                    conf=params["conf"], iou=params["iou"]))
+
+        try:
+            records = process(paths)
+        except Exception:
+            # Un archivo problemático no invalida el grupo: se reintenta imagen a imagen
+            records = []
+            for path in paths:
+                try:
+                    records.extend(process([path]))
+                except Exception as e:
+                    records.append(error_record(path, e))
+        for record in records:
+            record.setdefault("frame", None)
+        return kind, paths, records
+    return kind, paths, _video_records(paths[0], params, spool_dir)
+
+
+def _video_records(path, params, spool_dir):
+    """Un registro por frame procesado, volcados por bloques a un JSONL temporal cuya ruta se devuelve"""
+    from detections import records_from_array, results_to_array
+    from video_pipeline import batched, read_frames
+
+    spool = os.path.join(spool_dir, f"video-{os.getpid()}-{time.time_ns()}.jsonl")
+    stride = max(1, params["video_stride"])
+    frames = ((index, frame) for index, frame in read_frames(path) if index % stride == 0)
+    with open(spool, "w", encoding="utf-8") as out:
+        try:
+            for batch in batched(frames, params["batch_size"]):
+                start = time.perf_counter()
+                results = _predict([frame for _, frame in batch], imgsz=params["imgsz"], conf=params["conf"],
+                                   iou=params["iou"])
+                per_frame_ms = (time.perf_counter() - start) * 1000 / len(batch)
+                for (index, frame), result in zip(batch, results):
+                    out.write(json.dumps({
+                        "file": path,
+                        "frame": index,
+                        "width": frame.shape[1],
+                        "height": frame.shape[0],
+                        "ms": round(per_frame_ms, 1),
+                        "detections": records_from_array(results_to_array(result), result.names),
+                    }, ensure_ascii=False) + "\n")
+        except Exception as e:
+            # Los frames ya procesados se conservan y el error queda registrado en su propia fila
+            out.write(json.dumps(error_record(path, e), ensure_ascii=False) + "\n")
+    return spool
+
+
+def read_chunks(records, size=CHUNK_RECORDS):
+    """Registros de una tarea en bloques: la lista tal cual o el JSONL temporal leído por partes"""
+    if isinstance(records, list):
+        yield records
+        return
+    try:
+        with open(records, encoding="utf-8") as f:
+            chunk = []
+            for line in f:
+                chunk.append(json.loads(line))
+                if len(chunk) == size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+    finally:
+        os.remove(records)
+
+
+class JsonlSink:
+    """Resultados en un único JSONL al que se añaden líneas (compatible con reanudar)"""
+
+    def __init__(self, path, position=None):
+        self.path = path
+        if os.path.exists(path):
+            self._rollback(position)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _rollback(self, position):
+        """Descartar lo escrito tras el último checkpoint, o al menos una última línea incompleta"""
+        size = os.path.getsize(self.path)
+        if position is None:
+            position = size
+            with open(self.path, "rb") as f:
+                while position > 0:
+                    start = max(0, position - 65536)
+                    f.seek(start)
+                    newline = f.read(position - start).rfind(b"\n")
+                    if newline >= 0:
+                        position = start + newline + 1
+                        break
+                    position = start
+        if position < size:
+            os.truncate(self.path, position)
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def position(self):
+        """Bytes ya escritos y sincronizados en disco"""
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Resultados como partes Parquet dentro de una carpeta (una parte por bloque de cada tarea terminada)"""
+
+    def __init__(self, path, position=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("La salida Parquet requiere 'pyarrow' (pip install pyarrow)")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(name for name in os.listdir(path) if name.endswith(".parquet"))
+        if position is not None:
+            # Partes escritas tras el último checkpoint: su tarea se vuelve a procesar
+            for name in parts[position:]:
+                os.remove(os.path.join(path, name))
+            parts = parts[:position]
+        self._part = len(parts)
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not records:
+            return
+        rows = [{field: record.get(field) for field in RECORD_FIELDS} for record in records]
+        target = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+        # Escribir a un temporal y renombrar: una parte nunca queda a medias
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schema()), target + ".tmp")
+        with open(target + ".tmp", "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(target + ".tmp", target)
+        self._part += 1
+
+    def position(self):
+        """Partes ya escritas"""
+        return self._part
+
+    @staticmethod
+    def schema():
+        """Esquema fijo para que todas las partes se puedan leer como un único dataset"""
+        import pyarrow as pa
+
+        detection = pa.struct([
+            ("class", pa.string()),
+            ("class_id", pa.int64()),
+            ("confidence", pa.float64()),
+            ("box", pa.list_(pa.float64())),
+        ])
+        return pa.schema([
+            ("file", pa.string()),
+            ("frame", pa.int64()),
+            ("width", pa.int64()),
+            ("height", pa.int64()),
+            ("ms", pa.float64()),
+            ("error", pa.string()),
+            ("detections", pa.list_(detection)),
+        ])
+
+    def close(self):
+        pass
+
+
+class Checkpoint:
+    """Registro de archivos ya escritos en la salida y de la posición de la salida tras cada tarea"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.position = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        entry = None
+                    if isinstance(entry, dict):
+                        self.done.update(entry["paths"])
+                        self.position = entry.get("position")
+                    else:
+                        # Checkpoints antiguos: una ruta por línea
+                        self.done.add(line)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, paths, position=None):
+        """Registrar la tarea solo después de que sus registros estén sincronizados en la salida"""
+        self._file.write(json.dumps({"paths": list(paths), "position": position}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run(inputs, output, weights="yolo11n.pt", backend="PyTorch", fmt=None, workers=None, batch_size=8, imgsz=640,
+        conf=0.25, iou=0.7, images_per_task=64, video_stride=1, resume=False, log=print):
+    """Procesar las entradas con un pool de procesos escribiendo los resultados a medida que terminan"""
+    from backends import resolve_model
+
+    fmt = fmt or ("parquet" if output.endswith(".parquet") else "jsonl")
+    checkpoint_path = output.rstrip("/\\") + ".checkpoint"
+    if not resume and (os.path.exists(output) or os.path.exists(checkpoint_path)):
+        raise FileExistsError(f"La salida ya existe: {output} (usa --resume para continuar)")
+
+    images, videos = collect_inputs(inputs)
+    checkpoint = Checkpoint(checkpoint_path)
+    pending_images = [path for path in images if path not in checkpoint.done]
+    pending_videos = [path for path in videos if path not in checkpoint.done]
+    tasks = plan_tasks(pending_images, pending_videos, images_per_task)
+    skipped = len(images) + len(videos) - len(pending_images) - len(pending_videos)
+    log(f"📂 {len(images)} imágenes y {len(videos)} videos ({skipped} ya procesados) en {len(tasks)} tareas")
+    if not tasks:
+        checkpoint.close()
+        return {"tasks": 0, "records": 0, "seconds": 0.0}
+
+    # Exportar (si hace falta) en el proceso principal antes de arrancar el pool
+    model_path = resolve_model(weights, backend, imgsz)
+    workers = workers or max(1, min(len(tasks), (os.cpu_count() or 1) // 2 or 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    params = {"batch_size": batch_size, "imgsz": imgsz, "conf": conf, "iou": iou, "video_stride": video_stride}
+
+    # Al reanudar, la salida vuelve a la posición del último checkpoint (sin duplicados ni líneas a medias)
+    sink = (ParquetSink if fmt == "parquet" else JsonlSink)(output, checkpoint.position)
+    spool_dir = checkpoint_path + ".spool"
+    os.makedirs(spool_dir, exist_ok=True)
+    start = time.time()
+    done_tasks = 0
+    written = 0
+    try:
+        # spawn: los procesos hijos no heredan hilos de torch del padre
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=init_worker,
+                                 initargs=(model_path, params, threads)) as pool:
+            queue = iter(tasks)
+            running = {}
+            while True:
+                # Solo unas pocas tareas en vuelo: la memoria no crece con el tamaño del directorio
+                while len(running) < workers * 2:
+                    task = next(queue, None)
+                    if task is None:
+                        break
+                    running[pool.submit(run_task, *task, spool_dir)] = task
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = None
+                for future in finished:
+                    kind, paths = running.pop(future)
+                    try:
+                        records = future.result()[2]
+                    except BrokenProcessPool as e:
+                        # El proceso murió (memoria, cierre, inicialización): no es un fallo de estos archivos,
+                        # así que no se marcan y --resume los vuelve a procesar
+                        broken = e
+                        continue
+                    except Exception as e:
+                        # Un fallo de la tarea queda registrado en la salida y la ejecución continúa
+                        records = [error_record(path, e) for path in paths]
+                        log(f"⚠️ Error en la tarea ({kind}): {e}")
+                    for chunk in read_chunks(records):
+                        sink.write(chunk)
+                        written += len(chunk)
+                    checkpoint.mark(paths, sink.position())
+                    done_tasks += 1
+                    elapsed = time.time() - start
+                    log(f"✅ Tarea {done_tasks}/{len(tasks)} ({kind}) · {written} registros · {elapsed:.0f}s")
+                if broken is not None:
+                    raise broken
+    except BrokenProcessPool as e:
+        raise RuntimeError(f"El pool de procesos dejó de funcionar ({e}); usa --resume para continuar") from e
+    finally:
+        sink.close()
+        checkpoint.close()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    return {"tasks": done_tasks, "records": written, "seconds": time.time() - start}
+
+
+def main(argv=None):
+    """Función principal"""
+    from backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Detección YOLO11 por lotes sobre imágenes y videos")
+    parser.add_argument("inputs", nargs="+", help="Archivos o carpetas de imágenes y videos")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Archivo .jsonl o carpeta .parquet (una parte por bloque de registros)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None,
+                        help="Formato de salida (por defecto según la extensión)")
+    parser.add_argument("--model", default="yolo11n.pt")
+    parser.add_argument("--backend", default="PyTorch", choices=list(BACKENDS))
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (uno con su modelo cada uno)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.7)
+    parser.add_argument("--images-per-task", type=int, default=64,
+                        help="Imágenes por tarea (unidad de escritura y de reanudación)")
+    parser.add_argument("--video-stride", type=int, default=1, help="Procesar uno de cada N frames de video")
+    parser.add_argument("--resume", action="store_true", help="Continuar una ejecución interrumpida")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run(args.inputs, args.output, weights=args.model, backend=args.backend, fmt=args.format,
+                      workers=args.workers, batch_size=args.batch_size, imgsz=args.imgsz, conf=args.conf,
+                      iou=args.iou, images_per_task=args.images_per_task, video_stride=args.video_stride,
+                      resume=args.resume)
+    except (FileExistsError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🏁 {summary['records']} registros en {summary['seconds']:.1f}s → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
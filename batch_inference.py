@@ -0,0 +1,232 @@
+"""
+Inferencia por lotes de imágenes con letterbox a tamaño fijo y exportación de resultados
+"""
+
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from detections import records_from_array, results_to_array
+from renderer import draw_detections
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+# Decodificar los JPEG mucho mayores que la entrada del modelo directamente a 1/2, 1/4 o 1/8 de resolución
+REDUCED_DECODE = os.environ.get("YOLO_REDUCED_DECODE", "1") == "1"
+REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+# Marcadores SOF (inicio de frame) de JPEG; 0xC4, 0xC8 y 0xCC tienen otro significado
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """(ancho, alto) leídos de la cabecera de un JPEG sin decodificarlo, o None si no es JPEG"""
+    view = memoryview(data).cast("B")
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(view):
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:
+            # Bytes de relleno entre segmentos
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            return (view[i + 7] << 8) | view[i + 8], (view[i + 5] << 8) | view[i + 6]
+        i += 2 + ((view[i + 2] << 8) | view[i + 3])
+    return None
+
+
+def reduction_factor(data, target_size):
+    """Mayor factor de reducción que deja el lado mayor del JPEG por encima de target_size (1 si no aplica)"""
+    size = jpeg_size(data)
+    if size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if max(size) / factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_image(data, target_size=None):
+    """Decodificar bytes a BGR una sola vez, reducidos si superan mucho target_size
+
+    Devuelve (imagen, factor de reducción, (ancho, alto) originales).
+    """
+    factor = reduction_factor(data, target_size) if target_size and REDUCED_DECODE else 1
+    # np.frombuffer no copia: acepta bytes o la memoria del archivo subido (getbuffer)
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    if image is None:
+        raise ValueError("Formato de imagen no soportado")
+    height, width = image.shape[:2]
+    if factor == 1:
+        return image, 1, (width, height)
+    original = jpeg_size(data)
+    # La orientación EXIF se aplica al decodificar: la cabecera puede tener los lados intercambiados
+    if (original[0] > original[1]) != (width > height):
+        original = original[::-1]
+    return image, factor, original
+
+
+def letterbox(image, size=640, color=(114, 114, 114), out=None):
+    """Redimensionar conservando la proporción y rellenar hasta size x size (en `out` si se indica)"""
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+
+    if out is None:
+        if (new_w, new_h) != (width, height):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+        return padded, ratio, (left, top)
+
+    # Buffer reutilizable: rellenar solo los márgenes y redimensionar directamente dentro
+    out[:top] = color
+    out[top + new_h:] = color
+    out[top:top + new_h, :left] = color
+    out[top:top + new_h, left + new_w:] = color
+    region = out[top:top + new_h, left:left + new_w]
+    if (new_w, new_h) != (width, height):
+        cv2.resize(image, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+    else:
+        np.copyto(region, image)
+    return out, ratio, (left, top)
+
+
+def unletterbox_boxes(xyxy, ratio, pad, shape):
+    """Llevar cajas del espacio letterbox a coordenadas de la imagen original"""
+    boxes = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4).copy()
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return boxes
+
+
+def decode_image_bytes(data):
+    """Decodificar bytes de imagen a un array BGR a resolución completa"""
+    return decode_image(data)[0]
+
+
+def iter_uploaded_images(uploaded_files):
+    """Recorrer imágenes subidas sueltas o dentro de archivos zip"""
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.lower().endswith(".zip"):
+            yield from iter_zip_images(uploaded_file)
+        else:
+            yield uploaded_file.name, uploaded_file.getvalue()
+
+
+def iter_zip_images(file):
+    """Recorrer las imágenes contenidas en un zip"""
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            yield info.filename, archive.read(info)
+
+
+def iter_folder_images(folder):
+    """Recorrer las imágenes de una carpeta del servidor (recursivo)"""
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    yield os.path.relpath(path, folder), f.read()
+
+
+def run_batches(images, predict_fn, batch_size=8, imgsz=640, keep_annotated=0, **kwargs):
+    """Procesar imágenes (nombre, bytes) en lotes con un forward por lote"""
+    batch = []
+    kept = 0
+    # Entradas letterbox del lote: se reservan una vez y se reutilizan en todos los lotes
+    buffers = np.empty((batch_size, imgsz, imgsz, 3), dtype=np.uint8)
+    for name, data in images:
+        try:
+            image, scale, size = decode_image(data, imgsz)
+        except Exception as e:
+            yield {"file": name, "error": str(e), "detections": []}
+            continue
+        batch.append((name, image, scale, size))
+        if len(batch) == batch_size:
+            for record in _run_batch(batch, predict_fn, imgsz, keep_annotated - kept, buffers, **kwargs):
+                kept += "annotated" in record
+                yield record
+            batch = []
+    if batch:
+        yield from _run_batch(batch, predict_fn, imgsz, keep_annotated - kept, buffers, **kwargs)
+
+
+def _run_batch(batch, predict_fn, imgsz, keep_annotated, buffers, **kwargs):
+    """Ejecutar un lote ya decodificado y convertir resultados a registros"""
+    letterboxed = [letterbox(image, imgsz, out=buffer) for (_, image, _, _), buffer in zip(batch, buffers)]
+    start = time.perf_counter()
+    results = predict_fn([padded for padded, _, _ in letterboxed], imgsz=imgsz, **kwargs)
+    per_image_ms = (time.perf_counter() - start) * 1000 / len(batch)
+
+    for i, ((name, image, scale, size), (_, ratio, pad), result) in enumerate(zip(batch, letterboxed, results)):
+        data = results_to_array(result)
+        data[:, :4] = unletterbox_boxes(data[:, :4], ratio, pad, image.shape)
+        if i < keep_annotated:
+            annotated = draw_detections(image, data, result.names)
+        # Coordenadas y tamaño en la resolución original aunque se haya decodificado reducida
+        if scale != 1:
+            data[:, :4] = (data[:, :4] * scale).clip(0, [size[0], size[1], size[0], size[1]])
+        detections = records_from_array(data, result.names)
+        record = {
+            "file": name,
+            "width": size[0],
+            "height": size[1],
+            "ms": round(per_image_ms, 1),
+            "detections": detections,
+        }
+        if i < keep_annotated:
+            record["annotated"] = annotated
+        yield record
+
+
+def summary_rows(records):
+    """Tabla resumen con una fila por imagen"""
+    rows = []
+    for record in records:
+        counts = Counter(d["class"] for d in record["detections"])
+        rows.append({
+            "archivo": record["file"],
+            "objetos": len(record["detections"]),
+            "clases": ", ".join(f"{name}×{n}" for name, n in counts.most_common()),
+            "ms": record.get("ms"),
+            "error": record.get("error", ""),
+        })
+    return rows
+
+
+def to_csv(records):
+    """Exportar detecciones a CSV (una fila por detección)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["file", "class", "confidence", "x1", "y1", "x2", "y2"])
+    for record in records:
+        for d in record["detections"]:
+            writer.writerow([record["file"], d["class"], d["confidence"], *d["box"]])
+    return buffer.getvalue()
+
+
+def to_json(records):
+    """Exportar detecciones a JSON (un objeto por imagen)"""
+    clean = [{k: v for k, v in record.items() if k != "annotated"} for record in records]
+    return json.dumps(clean, ensure_ascii=False, indent=2)
@@ -0,0 +1,275 @@
+"""
+Benchmark reproducible de modelos, tamaños de entrada, lotes y backends en la CPU actual
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from backends import BACKENDS, resolve_model
+from model_cache import MODEL_OPTIONS
+
+# Identificador corto de backend para la línea de comandos -> nombre visible
+BACKEND_IDS = {(fmt or "pytorch"): name for name, fmt in BACKENDS.items()}
+
+DEFAULT_IMGSZ = (320, 640)
+DEFAULT_BATCH = (1, 4)
+
+
+def read_rss_bytes():
+    """Memoria residente actual del proceso"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # Sin /proc solo está disponible el máximo del proceso (KB en Linux, bytes en macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRssSampler:
+    """Muestrear la memoria residente en un hilo y conservar el máximo"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = read_rss_bytes()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, read_rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, read_rss_bytes())
+
+
+def load_images(folder=None, synthetic=0, size=(480, 640), seed=0):
+    """Conjunto de imágenes BGR: carpeta, imágenes sintéticas o las de ejemplo de Ultralytics"""
+    if synthetic:
+        rng = np.random.default_rng(seed)
+        return [rng.integers(0, 255, size=(*size, 3), dtype=np.uint8) for _ in range(synthetic)]
+
+    import cv2
+
+    if folder:
+        from batch_inference import decode_image_bytes, iter_folder_images
+
+        images = [decode_image_bytes(data) for _, data in iter_folder_images(folder)]
+    else:
+        from quantization import calibration_images
+
+        images = [cv2.imread(path) for path in calibration_images()]
+    images = [image for image in images if image is not None]
+    if not images:
+        raise ValueError("No se encontraron imágenes para el benchmark")
+    return images
+
+
+def batches_of(images, batch_size, count):
+    """Generar `count` lotes recorriendo las imágenes de forma cíclica"""
+    position = 0
+    for _ in range(count):
+        batch = [images[(position + i) % len(images)] for i in range(batch_size)]
+        position += batch_size
+        yield batch
+
+
+def run_config(model, images, imgsz, batch_size, runs, warmup):
+    """Medir latencia por lote y throughput de una configuración"""
+    for batch in batches_of(images, batch_size, warmup):
+        model(batch, imgsz=imgsz, device="cpu", verbose=False)
+    timings = []
+    start = time.perf_counter()
+    for batch in batches_of(images, batch_size, runs):
+        batch_start = time.perf_counter()
+        model(batch, imgsz=imgsz, device="cpu", verbose=False)
+        timings.append((time.perf_counter() - batch_start) * 1000)
+    elapsed = time.perf_counter() - start
+    timings = np.array(timings)
+    p50, p95, p99 = np.percentile(timings, (50, 95, 99))
+    return {
+        "images_s": round(runs * batch_size / elapsed, 2),
+        "batch_ms_mean": round(float(timings.mean()), 2),
+        "batch_ms_p50": round(float(p50), 2),
+        "batch_ms_p95": round(float(p95), 2),
+        "batch_ms_p99": round(float(p99), 2),
+        "image_ms_mean": round(float(timings.mean()) / batch_size, 2),
+    }
+
+
+def run_benchmark(models, backends=("pytorch",), imgsizes=DEFAULT_IMGSZ, batch_sizes=DEFAULT_BATCH, runs=10,
+                  warmup=2, images=None, log=print):
+    """Recorrer modelos × backends × imgsz × lote; una fila por configuración"""
+    from ultralytics import YOLO
+
+    images = images if images is not None else load_images()
+    rows = []
+    for weights in models:
+        for backend_id in backends:
+            for imgsz in imgsizes:
+                base = {"model": weights, "backend": backend_id, "imgsz": imgsz}
+                try:
+                    # Los formatos exportados fijan el tamaño de entrada, así que se exporta por imgsz
+                    path = resolve_model(weights, BACKEND_IDS[backend_id], imgsz)
+                    rss_before = read_rss_bytes()
+                    with PeakRssSampler() as sampler:
+                        model = YOLO(path, task="detect")
+                        for batch_size in batch_sizes:
+                            log(f"⏱️ {weights} · {backend_id} · imgsz={imgsz} · lote={batch_size}")
+                            try:
+                                row = run_config(model, images, imgsz, batch_size, runs, warmup)
+                                rows.append({**base, "batch": batch_size, **row, "error": ""})
+                            except Exception as e:
+                                rows.append({**base, "batch": batch_size, "error": str(e)})
+                    peak_mb = round(sampler.peak / 1024 ** 2, 1)
+                    model_mb = round(max(sampler.peak - rss_before, 0) / 1024 ** 2, 1)
+                    for row in rows:
+                        if row["model"] == weights and row["backend"] == backend_id and row["imgsz"] == imgsz:
+                            row.update(peak_rss_mb=peak_mb, rss_increase_mb=model_mb)
+                    del model
+                    gc.collect()
+                except Exception as e:
+                    rows.extend({**base, "batch": batch_size, "error": str(e)} for batch_size in batch_sizes)
+    return rows
+
+
+def environment():
+    """Datos del equipo y versiones para poder comparar resultados entre ejecuciones"""
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    for package in ("torch", "ultralytics", "onnxruntime", "openvino"):
+        try:
+            module = __import__(package)
+            info[package] = getattr(module, "__version__", "?")
+        except ImportError:
+            pass
+    try:
+        import torch
+
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def row_key(row):
+    return row["model"], row["backend"], row["imgsz"], row["batch"]
+
+
+def compare(baseline, current, threshold=5.0):
+    """Comparar dos informes; devuelve filas con la variación porcentual de throughput, p95 y memoria"""
+    previous = {row_key(row): row for row in baseline["results"] if not row.get("error")}
+    rows = []
+    for row in current["results"]:
+        old = previous.get(row_key(row))
+        if old is None or row.get("error"):
+            continue
+
+        def delta(field):
+            if not old.get(field):
+                return None
+            return round((row[field] - old[field]) / old[field] * 100, 1)
+
+        throughput, p95, rss = delta("images_s"), delta("batch_ms_p95"), delta("peak_rss_mb")
+        rows.append({
+            "model": row["model"],
+            "backend": row["backend"],
+            "imgsz": row["imgsz"],
+            "batch": row["batch"],
+            "images_s": row["images_s"],
+            "images_s_pct": throughput,
+            "batch_ms_p95": row["batch_ms_p95"],
+            "batch_ms_p95_pct": p95,
+            "peak_rss_mb_pct": rss,
+            "regression": bool((throughput is not None and throughput < -threshold)
+                               or (p95 is not None and p95 > threshold)),
+        })
+    return rows
+
+
+def print_table(rows, columns):
+    """Imprimir filas como tabla de texto"""
+    widths = {c: max([len(c)] + [len(str(row.get(c, ""))) for row in rows]) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de modelos YOLO11 en CPU")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_OPTIONS.values()),
+                        help="Pesos a medir (por defecto todos los modelos de la aplicación)")
+    parser.add_argument("--backends", nargs="+", default=["pytorch"], choices=list(BACKEND_IDS))
+    parser.add_argument("--imgsz", nargs="+", type=int, default=list(DEFAULT_IMGSZ))
+    parser.add_argument("--batch", nargs="+", type=int, default=list(DEFAULT_BATCH))
+    parser.add_argument("--runs", type=int, default=10, help="Lotes medidos por configuración")
+    parser.add_argument("--warmup", type=int, default=2, help="Lotes de calentamiento por configuración")
+    parser.add_argument("--images", help="Carpeta de imágenes (por defecto las de ejemplo de Ultralytics)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Usar N imágenes sintéticas 640x480")
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--compare", default=None, help="Informe JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Variación (%%) considerada regresión")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Salir con código 1 si hay regresiones frente a --compare")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.synthetic)
+    print(f"🚀 Benchmark con {len(images)} imágenes en {os.cpu_count()} CPUs")
+    report = {
+        "environment": environment(),
+        "settings": {"runs": args.runs, "warmup": args.warmup, "images": len(images),
+                     "source": args.images or ("synthetic" if args.synthetic else "ultralytics-assets")},
+        "results": run_benchmark(args.models, args.backends, args.imgsz, args.batch, args.runs, args.warmup,
+                                 images),
+    }
+
+    print()
+    print_table(report["results"], ["model", "backend", "imgsz", "batch", "images_s", "batch_ms_p50",
+                                    "batch_ms_p95", "batch_ms_p99", "peak_rss_mb", "error"])
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        diff = compare(baseline, report, args.threshold)
+        print(f"\n📊 Comparación con {args.compare}")
+        if diff:
+            print_table(diff, ["model", "backend", "imgsz", "batch", "images_s", "images_s_pct", "batch_ms_p95",
+                               "batch_ms_p95_pct", "peak_rss_mb_pct", "regression"])
+        else:
+            print("No hay configuraciones en común")
+        if args.fail_on_regression and any(row["regression"] for row in diff):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
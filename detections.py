@@ -0,0 +1,76 @@
+"""
+Utilidades de detecciones sobre arrays NumPy (NMS y construcción de resultados)
+"""
+
+import numpy as np
+
+# Desplazamiento por clase para hacer NMS por clase en una sola pasada (igual que Ultralytics)
+MAX_WH = 7680
+
+
+def box_iou(box, boxes):
+    """IoU entre una caja y un conjunto de cajas xyxy"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Supresión de no máximos voraz; devuelve los índices conservados por puntuación"""
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[i], boxes[order[1:]])
+        order = order[1:][ious <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, classes, iou_threshold, agnostic=False):
+    """NMS por clase desplazando las cajas según su clase"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = 0 if agnostic else classes.reshape(-1, 1).astype(np.float32) * MAX_WH
+    return nms(boxes + offsets, scores, iou_threshold)
+
+
+def filter_detections(data, conf, iou, max_det=300, agnostic=False):
+    """Aplicar umbral de confianza y NMS a detecciones (n, 6): x1, y1, x2, y2, conf, cls"""
+    data = data[data[:, 4] >= conf]
+    keep = batched_nms(data[:, :4], data[:, 4], data[:, 5], iou, agnostic=agnostic)
+    return data[keep[:max_det]]
+
+
+def make_results(orig_img, names, data, path="image0.jpg"):
+    """Construir un objeto Results de Ultralytics a partir de detecciones (n, 6)"""
+    import torch
+    from ultralytics.engine.results import Results
+
+    boxes = torch.from_numpy(np.ascontiguousarray(data, dtype=np.float32)).reshape(-1, 6)
+    return Results(orig_img=orig_img, path=path, names=names, boxes=boxes)
+
+
+def results_to_array(result):
+    """Extraer las detecciones de un Results como array (n, 6)"""
+    return result.boxes.data.cpu().numpy().astype(np.float32)
+
+
+def records_from_array(data, names):
+    """Convertir detecciones (n, 6) en una lista de diccionarios serializables"""
+    return [
+        {
+            "class": names[int(row[5])],
+            "class_id": int(row[5]),
+            "confidence": round(float(row[4]), 4),
+            "box": [round(float(v), 1) for v in row[:4]],
+        }
+        for row in data
+    ]
@@ -0,0 +1,346 @@
+"""
+Cola de trabajos de video en segundo plano: estado persistente en disco, progreso/ETA, cancelación y límite por equipo
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import get_metrics
+from model_cache import get_registry
+from video_pipeline import DEFAULT_WORKERS, process_video_threaded, process_video_tracked
+
+JOBS_DIR = os.environ.get("YOLO_JOBS_DIR", os.path.join("runs", "jobs"))
+MAX_CONCURRENT = int(os.environ.get("YOLO_JOBS_MAX_CONCURRENT", "1"))
+MAX_AGE_HOURS = float(os.environ.get("YOLO_JOBS_MAX_AGE_H", "72"))
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "error", "cancelled")
+
+try:
+    import fcntl
+except ImportError:
+    # Sin fcntl (Windows) el límite solo se aplica dentro de cada proceso
+    fcntl = None
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se procesaba"""
+
+
+class FileLock:
+    """Cerrojo de archivo compartido entre procesos del mismo equipo (no bloqueante salvo que se pida)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking=False):
+        handle = open(self.path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class HostSlots:
+    """Huecos de ejecución numerados: como mucho `limit` trabajos a la vez en todo el equipo"""
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = max(1, limit)
+
+    def acquire(self, stop, poll=0.5):
+        while not stop.is_set():
+            for i in range(self.limit):
+                lock = FileLock(os.path.join(self.directory, f".slot-{i}.lock"))
+                if lock.acquire():
+                    return lock
+            stop.wait(poll)
+        return None
+
+
+def _write_json(path, data):
+    """Escritura atómica: el estado nunca queda a medias si el proceso muere"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class JobManager:
+    """Cola de trabajos de video con hilos de trabajo y estado en runs/jobs/<id>/job.json"""
+
+    def __init__(self, directory=JOBS_DIR, max_concurrent=MAX_CONCURRENT):
+        self.directory = directory
+        self.max_concurrent = max(1, max_concurrent)
+        self.slots = HostSlots(directory, self.max_concurrent)
+        self._queue = queue.Queue()
+        self._cancel = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"video-job-{i}", daemon=True)
+            for i in range(self.max_concurrent)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # --- Estado en disco ---
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def _state_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), "job.json")
+
+    def get(self, job_id):
+        """Estado de un trabajo o None"""
+        # Los IDs son hexadecimales: evita rutas fuera de la carpeta de trabajos
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _state_lock(self, job_id):
+        """Leer, modificar y escribir job.json sin que otro hilo o proceso del equipo escriba en medio"""
+        with self._lock:
+            lock = FileLock(os.path.join(self._job_dir(job_id), ".state.lock"))
+            lock.acquire(blocking=True)
+            try:
+                yield
+            finally:
+                lock.release()
+
+    def _update(self, job_id, **fields):
+        with self._state_lock(job_id):
+            job = self.get(job_id) or {}
+            job.update(fields, updated=time.time())
+            _write_json(self._state_path(job_id), job)
+            return job
+
+    def list_jobs(self, limit=20):
+        """Trabajos más recientes primero"""
+        jobs = []
+        for name in os.listdir(self.directory):
+            job = self.get(name) if os.path.isdir(self._job_dir(name)) else None
+            if job is not None:
+                jobs.append(job)
+        jobs.sort(key=lambda job: job.get("created", 0), reverse=True)
+        return jobs[:limit]
+
+    def _claim(self, job_id):
+        """Cerrojo del trabajo: lo tiene el proceso que lo está ejecutando"""
+        return FileLock(os.path.join(self._job_dir(job_id), ".lock"))
+
+    def _recover(self):
+        """Volver a encolar los trabajos que quedaron pendientes o a medias al reiniciar el proceso"""
+        for job in sorted(self.list_jobs(limit=None), key=lambda job: job.get("created", 0)):
+            if job.get("status") not in ACTIVE:
+                continue
+            # Si otro proceso del equipo lo está ejecutando, su estado no se toca
+            claim = self._claim(job["job_id"])
+            if not claim.acquire():
+                continue
+            try:
+                if job.get("cancel_requested"):
+                    self._update(job["job_id"], status="cancelled", eta_s=None, finished=time.time())
+                    continue
+                self._update(job["job_id"], status="queued", frames=0, eta_s=None)
+            finally:
+                claim.release()
+            self._queue.put(job["job_id"])
+
+    # --- API pública ---
+
+    def submit(self, input_path, model, params=None, options=None, name=None):
+        """Crear un trabajo a partir de un video en disco y encolarlo"""
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        # La entrada se enlaza en la carpeta del trabajo para que la limpieza de subidas no la borre
+        target = os.path.join(job_dir, "input" + (os.path.splitext(input_path)[1] or ".mp4"))
+        try:
+            os.link(input_path, target)
+        except OSError:
+            shutil.copy2(input_path, target)
+
+        job = {
+            "job_id": job_id,
+            "name": name or os.path.basename(input_path),
+            "status": "queued",
+            "model": model,
+            "params": params or {},
+            "options": options or {},
+            "input_path": target,
+            "output_path": os.path.join(job_dir, "output.mp4"),
+            "frames": 0,
+            "total_frames": 0,
+            "fps": 0.0,
+            "eta_s": None,
+            "created": time.time(),
+        }
+        with self._lock:
+            _write_json(self._state_path(job_id), job)
+        self._queue.put(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """Cancelar un trabajo en cola o en curso; devuelve False si ya había terminado"""
+        if self.get(job_id) is None:
+            return False
+        with self._state_lock(job_id):
+            job = self.get(job_id)
+            if job is None or job.get("status") in FINISHED:
+                return False
+            event = self._cancel.get(job_id)
+            if event is not None:
+                # En curso en este proceso
+                event.set()
+                return True
+            now = time.time()
+            if job.get("status") == "queued":
+                job.update(status="cancelled", finished=now, updated=now)
+            else:
+                # En curso en otro proceso: lo detiene su comprobación de progreso
+                job.update(cancel_requested=True, updated=now)
+            _write_json(self._state_path(job_id), job)
+        return True
+
+    def cleanup(self, max_age_hours=MAX_AGE_HOURS):
+        """Eliminar trabajos terminados hace más de las horas indicadas"""
+        limit = time.time() - max_age_hours * 3600
+        removed = 0
+        for job in self.list_jobs(limit=None):
+            if job.get("status") in FINISHED and job.get("finished", time.time()) < limit:
+                shutil.rmtree(self._job_dir(job["job_id"]), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Ejecución ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            job = self.get(job_id)
+            if job is None or job.get("status") != "queued":
+                continue
+            # Otro proceso del equipo puede haber recuperado el mismo trabajo
+            claim = self._claim(job_id)
+            if not claim.acquire():
+                continue
+            slot = self.slots.acquire(self._stop)
+            try:
+                if slot is not None and (self.get(job_id) or {}).get("status") == "queued":
+                    self._execute(job)
+            finally:
+                if slot is not None:
+                    slot.release()
+                claim.release()
+
+    def _execute(self, job):
+        job_id = job["job_id"]
+        # Pasar a "running" y registrar el evento de cancelación a la vez que cancel() comprueba el estado
+        with self._state_lock(job_id):
+            state = self.get(job_id) or {}
+            if state.get("status") != "queued":
+                return
+            cancel = self._cancel[job_id] = threading.Event()
+            now = time.time()
+            state.update(status="running", started=now, updated=now)
+            _write_json(self._state_path(job_id), state)
+
+        registry = get_registry()
+        model = job["model"]
+
+        def predict_fn(frames, **kwargs):
+            results = registry.predict(model, frames, device="cpu", verbose=False, **kwargs)
+            get_metrics().observe_results(results, "jobs")
+            return results
+
+        last_saved = [0.0]
+
+        def progress(done, total, elapsed):
+            if cancel.is_set():
+                raise JobCancelled()
+            now = time.time()
+            # Guardar el progreso como mucho una vez por segundo
+            if now - last_saved[0] >= 1.0 or (total and done >= total):
+                fps = done / elapsed if elapsed > 0 else 0.0
+                eta = (total - done) / fps if fps > 0 and total > done else None
+                state = self._update(job_id, frames=done, total_frames=total, fps=round(fps, 1),
+                                     eta_s=round(eta, 1) if eta is not None else None)
+                last_saved[0] = now
+                if state.get("cancel_requested"):
+                    raise JobCancelled()
+
+        options = job.get("options", {})
+        try:
+            if options.get("detect_every", 1) > 1:
+                summary = process_video_tracked(
+                    job["input_path"], predict_fn, detect_every=options["detect_every"],
+                    scene_threshold=options.get("scene_threshold", 0), batch_size=options.get("batch_size", 4),
+                    output_path=job["output_path"], progress=progress, metrics_input="jobs", **job["params"]
+                )
+            else:
+                summary = process_video_threaded(
+                    job["input_path"], predict_fn, batch_size=options.get("batch_size", 4),
+                    workers=options.get("workers", DEFAULT_WORKERS), output_path=job["output_path"],
+                    progress=progress, metrics_input="jobs", **job["params"]
+                )
+        except JobCancelled:
+            self._update(job_id, status="cancelled", eta_s=None, finished=time.time())
+            return
+        except Exception as e:
+            self._update(job_id, status="error", error=str(e), eta_s=None, finished=time.time())
+            return
+        finally:
+            with self._lock:
+                self._cancel.pop(job_id, None)
+
+        summary.pop("output_path", None)
+        self._update(job_id, status="done", eta_s=0, finished=time.time(),
+                     summary={k: round(v, 1) if isinstance(v, float) else v for k, v in summary.items()},
+                     frames=summary["frames"])
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Obtener la cola de trabajos única del proceso"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+            _manager.cleanup()
+        return _manager
@@ -0,0 +1,192 @@
+"""
+Métricas de latencia por etapa (decodificar, preprocesar, inferir, NMS, anotar, codificar) con exportación Prometheus
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Límites superiores de los buckets del histograma en milisegundos
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Muestras recientes que se conservan por serie para calcular percentiles
+WINDOW = int(os.environ.get("YOLO_METRICS_WINDOW", "2048"))
+
+STAGES = ("decode", "preprocess", "inference", "nms", "annotate", "encode")
+
+# Claves de Results.speed de Ultralytics y su etapa correspondiente
+SPEED_STAGES = {"preprocess": "preprocess", "inference": "inference", "postprocess": "nms"}
+
+# Solo local por defecto, igual que la API: YOLO_METRICS_HOST=0.0.0.0 lo expone a la red
+METRICS_HOST = os.environ.get("YOLO_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("YOLO_METRICS_PORT", "9100"))
+METRICS_ENABLED = os.environ.get("YOLO_METRICS_ENABLED", "0") == "1"
+
+
+class LatencyHistogram:
+    """Histograma acumulado de latencias más una ventana de muestras recientes para percentiles"""
+
+    def __init__(self, buckets=BUCKETS_MS, window=WINDOW):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, ms):
+        self.counts[bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.recent.append(ms)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        """Percentiles de la ventana reciente en milisegundos"""
+        if not self.recent:
+            return [0.0] * len(qs)
+        return [float(v) for v in np.percentile(np.fromiter(self.recent, dtype=np.float64), qs)]
+
+
+class StageMetrics:
+    """Histogramas de latencia por (entrada, etapa) compartidos por todo el proceso"""
+
+    def __init__(self, buckets=BUCKETS_MS, window=WINDOW):
+        self.buckets = buckets
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms, input_name="app"):
+        """Registrar la duración de una etapa en milisegundos"""
+        key = (input_name, stage)
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram(self.buckets, self.window)
+                self._series[key] = histogram
+            histogram.observe(float(ms))
+
+    @contextmanager
+    def time(self, stage, input_name="app"):
+        """Medir el bloque como una etapa"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000, input_name)
+
+    def observe_results(self, results, input_name="app"):
+        """Registrar preprocesado, inferencia y NMS a partir de Results.speed (ms por imagen)"""
+        for result in results:
+            speed = getattr(result, "speed", None) or {}
+            for key, stage in SPEED_STAGES.items():
+                if speed.get(key) is not None:
+                    self.observe(stage, speed[key], input_name)
+
+    def summary_rows(self):
+        """Tabla con recuento y percentiles por entrada y etapa"""
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda kv: (kv[0][0], _stage_order(kv[0][1])))
+            rows = []
+            for (input_name, stage), histogram in items:
+                p50, p95, p99 = histogram.percentiles()
+                rows.append({
+                    "entrada": input_name,
+                    "etapa": stage,
+                    "n": histogram.count,
+                    "p50_ms": round(p50, 1),
+                    "p95_ms": round(p95, 1),
+                    "p99_ms": round(p99, 1),
+                })
+        return rows
+
+    def prometheus_text(self):
+        """Exportar los histogramas en formato de texto de Prometheus (segundos)"""
+        lines = [
+            "# HELP yolo_stage_duration_seconds Duración de cada etapa del procesamiento",
+            "# TYPE yolo_stage_duration_seconds histogram",
+        ]
+        quantiles = [
+            "# HELP yolo_stage_duration_quantile_seconds Percentiles de las muestras recientes por etapa",
+            "# TYPE yolo_stage_duration_quantile_seconds gauge",
+        ]
+        with self._lock:
+            for (input_name, stage), histogram in sorted(self._series.items()):
+                labels = f'input="{_escape(input_name)}",stage="{_escape(stage)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'yolo_stage_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'yolo_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"yolo_stage_duration_seconds_sum{{{labels}}} {histogram.sum_ms / 1000:.6f}")
+                lines.append(f"yolo_stage_duration_seconds_count{{{labels}}} {histogram.count}")
+                for q, value in zip(("0.5", "0.95", "0.99"), histogram.percentiles()):
+                    quantiles.append(f'yolo_stage_duration_quantile_seconds{{{labels},quantile="{q}"}} '
+                                     f"{value / 1000:.6f}")
+        return "\n".join(lines + quantiles) + "\n"
+
+    def reset(self):
+        """Borrar todas las series"""
+        with self._lock:
+            self._series.clear()
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Obtener las métricas únicas del proceso"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = StageMetrics()
+        return _metrics
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Servidor mínimo que solo expone /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Iniciar una sola vez por proceso el endpoint /metrics en un hilo"""
+    global _metrics_server
+    with _server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,187 @@
+"""
+Registro de modelos YOLO11 compartido por todas las sesiones del proceso
+"""
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from runtime_config import get_settings as get_runtime_settings
+
+# Modelos YOLO11 disponibles: nombre visible -> archivo de pesos
+MODEL_OPTIONS = {
+    "YOLO11n (Nano - Más rápido)": "yolo11n.pt",
+    "YOLO11s (Small)": "yolo11s.pt",
+    "YOLO11m (Medium)": "yolo11m.pt",
+    "YOLO11l (Large)": "yolo11l.pt",
+    "YOLO11x (Extra Large - Más preciso)": "yolo11x.pt"
+}
+
+# Presupuesto de memoria para pesos cargados (MB) y número máximo de modelos
+DEFAULT_BUDGET_MB = int(os.environ.get("YOLO_MODEL_CACHE_MB", "1536"))
+DEFAULT_MAX_MODELS = int(os.environ.get("YOLO_MODEL_CACHE_MAX", "5"))
+
+
+def estimate_model_bytes(model, weights):
+    """Estimar la memoria que ocupa un modelo cargado"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.model.parameters())
+    except Exception:
+        # Backends exportados o modelos sin parámetros accesibles
+        if os.path.isdir(weights):
+            return sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, files in os.walk(weights)
+                for name in files
+            )
+        if os.path.exists(weights):
+            return os.path.getsize(weights)
+        return 0
+
+
+class ModelEntry:
+    """Modelo cargado con su grupo de réplicas; cada réplica atiende una inferencia a la vez"""
+
+    def __init__(self, key, replicas, size_bytes):
+        self.key = key
+        self.model = replicas[0]
+        self.workers = len(replicas)
+        self.size_bytes = size_bytes
+        self._pool = queue.Queue()
+        for replica in replicas:
+            self._pool.put(replica)
+
+    def predict(self, source, **kwargs):
+        """Ejecutar inferencia con la primera réplica libre"""
+        replica = self._pool.get()
+        try:
+            return replica(source, **kwargs)
+        finally:
+            self._pool.put(replica)
+
+    def warmup(self, source, **kwargs):
+        """Una inferencia en cada réplica para que ninguna pague el coste de la primera llamada"""
+        taken = [self._pool.get() for _ in range(self.workers)]
+        try:
+            for replica in taken:
+                replica(source, **kwargs)
+        finally:
+            for replica in taken:
+                self._pool.put(replica)
+
+
+class ModelRegistry:
+    """Caché LRU de modelos indexada por archivo de pesos y dispositivo"""
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024, max_models=DEFAULT_MAX_MODELS):
+        self.budget_bytes = budget_bytes
+        self.max_models = max_models
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def _load(self, weights, device):
+        """Cargar los pesos y moverlos al dispositivo indicado"""
+        from ultralytics import YOLO
+
+        if not str(weights).endswith(".pt"):
+            # Modelos exportados (ONNX, OpenVINO, TorchScript): el dispositivo se indica al predecir
+            return YOLO(weights, task="detect")
+
+        model = YOLO(weights)
+        # Forzar uso de CPU para evitar problemas de CUDA
+        model.to(device)
+        return model
+
+    def is_loaded(self, weights, device="cpu"):
+        """Indicar si el modelo ya está en memoria"""
+        with self._lock:
+            return (weights, device) in self._entries
+
+    def _lookup(self, key, workers):
+        """Entrada en caché con el número de réplicas configurado, o None"""
+        entry = self._entries.get(key)
+        if entry is None or entry.workers != workers:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, weights, device="cpu"):
+        """Obtener un modelo de la caché, cargándolo si es necesario"""
+        key = (weights, device)
+        workers = get_runtime_settings()["workers_per_model"]
+        with self._lock:
+            entry = self._lookup(key, workers)
+            if entry is not None:
+                return entry
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Solo una sesión carga cada modelo; el resto espera y lo reutiliza
+        with load_lock:
+            with self._lock:
+                entry = self._lookup(key, workers)
+                if entry is not None:
+                    return entry
+
+            try:
+                replicas = [self._load(weights, device) for _ in range(workers)]
+            except Exception:
+                # No dejar el cerrojo de una carga fallida: el siguiente intento empieza de cero
+                with self._lock:
+                    if self._loading.get(key) is load_lock:
+                        self._loading.pop(key)
+                raise
+            size = estimate_model_bytes(replicas[0], weights) * workers
+            entry = ModelEntry(key, replicas, size)
+
+            with self._lock:
+                self._entries[key] = entry
+                # Una entrada recargada (otro número de réplicas) conserva su posición: pasa a la más reciente
+                self._entries.move_to_end(key)
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+            return entry
+
+    def _evict(self, keep):
+        """Descartar los modelos menos usados hasta respetar el presupuesto"""
+        while len(self._entries) > 1:
+            total = sum(e.size_bytes for e in self._entries.values())
+            if total <= self.budget_bytes and len(self._entries) <= self.max_models:
+                break
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            # Las inferencias en curso conservan su referencia hasta terminar
+            self._entries.pop(oldest)
+
+    def predict(self, weights, source, device="cpu", **kwargs):
+        """Ejecutar inferencia con el modelo compartido"""
+        entry = self.get(weights, device)
+        return entry.predict(source, device=device, **kwargs)
+
+    def stats(self):
+        """Resumen de los modelos cargados"""
+        with self._lock:
+            return [
+                {"weights": key[0], "device": key[1], "workers": entry.workers, "mb": entry.size_bytes / (1024 * 1024)}
+                for key, entry in self._entries.items()
+            ]
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entries.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Obtener el registro único del proceso"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
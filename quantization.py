@@ -0,0 +1,169 @@
+"""
+Variantes INT8 de los modelos (ONNX Runtime) e informe de concordancia y latencia frente a FP32
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from batch_inference import IMAGE_EXTENSIONS, letterbox
+from detections import box_iou, results_to_array
+
+# Carpeta con imágenes representativas para calibrar la cuantización estática
+CALIBRATION_DIR = os.environ.get("YOLO_CALIBRATION_DIR", "calibration")
+CALIBRATION_LIMIT = int(os.environ.get("YOLO_CALIBRATION_LIMIT", "64"))
+
+
+def calibration_images(directory=CALIBRATION_DIR, limit=CALIBRATION_LIMIT):
+    """Rutas de las imágenes de calibración (o las de ejemplo de Ultralytics si no hay)"""
+    paths = []
+    if os.path.isdir(directory):
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        from ultralytics.utils import ASSETS
+
+        paths = [str(p) for p in ASSETS.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS]
+    return sorted(paths)[:limit]
+
+
+def preprocess(path, imgsz):
+    """Preparar una imagen como tensor NCHW float32 igual que el preprocesado de YOLO"""
+    image = cv2.imread(path)
+    padded, _, _ = letterbox(image, imgsz)
+    tensor = padded[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor)
+
+
+def _calibration_reader(input_name, paths, imgsz):
+    """Lector de calibración para onnxruntime.quantization"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            return None if path is None else {input_name: preprocess(path, imgsz)}
+
+    return ImageCalibrationReader()
+
+
+def _copy_metadata(source, target):
+    """Copiar los metadatos de Ultralytics (clases, stride, imgsz) al modelo cuantizado"""
+    import onnx
+
+    metadata = onnx.load(source, load_external_data=False).metadata_props
+    model = onnx.load(target)
+    del model.metadata_props[:]
+    model.metadata_props.extend(metadata)
+    onnx.save(model, target)
+
+
+def quantize_onnx(weights, fmt, imgsz, target):
+    """Generar una variante INT8 dinámica o estática a partir del ONNX FP32"""
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    from backends import export_model
+
+    fp32_path = export_model(weights, "onnx", imgsz)
+    if fmt == "onnx-int8-dynamic":
+        quantize_dynamic(fp32_path, target, weight_type=QuantType.QUInt8)
+    else:
+        paths = calibration_images()
+        input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+        quantize_static(
+            fp32_path,
+            target,
+            _calibration_reader(input_name, paths, imgsz),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+    _copy_metadata(fp32_path, target)
+    return target
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Emparejar detecciones (n, 6) por IoU: devuelve lista de (iou, misma_clase)"""
+    matches = []
+    if len(reference) == 0 or len(candidate) == 0:
+        return matches
+    available = np.ones(len(candidate), dtype=bool)
+    for box in reference[np.argsort(-reference[:, 4])]:
+        ious = np.where(available, box_iou(box[:4], candidate[:, :4]), -1.0)
+        best = int(np.argmax(ious))
+        if ious[best] >= iou_threshold:
+            available[best] = False
+            matches.append((float(ious[best]), bool(candidate[best, 5] == box[5])))
+    return matches
+
+
+def artifact_mb(path):
+    """Tamaño en disco de un modelo (archivo o directorio)"""
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+    else:
+        total = os.path.getsize(path) if os.path.exists(path) else 0
+    return total / (1024 * 1024)
+
+
+def _run_model(registry, path, images, imgsz, conf, iou):
+    """Detecciones y latencia media (ms) de un modelo sobre las imágenes"""
+    registry.predict(path, images[0], imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+    detections = []
+    start = time.perf_counter()
+    for image in images:
+        results = registry.predict(path, image, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+        detections.append(results_to_array(results[0]))
+    return detections, (time.perf_counter() - start) * 1000 / len(images)
+
+
+def agreement_report(reference_path, candidates, registry, imgsz=640, conf=0.25, iou=0.7, iou_threshold=0.5):
+    """Comparar variantes cuantizadas contra el modelo FP32 en concordancia y latencia"""
+    images = [cv2.imread(path) for path in calibration_images()]
+    images = [image for image in images if image is not None]
+    if not images:
+        raise ValueError("No hay imágenes de calibración disponibles")
+
+    reference, reference_ms = _run_model(registry, reference_path, images, imgsz, conf, iou)
+    reference_total = sum(len(d) for d in reference)
+    rows = [{
+        "variante": "FP32 (referencia)",
+        "ms": round(reference_ms, 1),
+        "aceleración": 1.0,
+        "concordancia": 1.0,
+        "precisión": 1.0,
+        "iou_medio": 1.0,
+        "clase_ok": 1.0,
+        "mb": round(artifact_mb(reference_path), 1),
+        "error": "",
+    }]
+
+    for name, path in candidates.items():
+        try:
+            detections, ms = _run_model(registry, path, images, imgsz, conf, iou)
+        except Exception as e:
+            rows.append({"variante": name, "error": str(e)})
+            continue
+        matches = [m for ref, cand in zip(reference, detections) for m in match_detections(ref, cand, iou_threshold)]
+        candidate_total = sum(len(d) for d in detections)
+        rows.append({
+            "variante": name,
+            "ms": round(ms, 1),
+            "aceleración": round(reference_ms / ms, 2) if ms else None,
+            # Fracción de detecciones FP32 que la variante reproduce (IoU >= umbral)
+            "concordancia": round(len(matches) / reference_total, 3) if reference_total else None,
+            # Fracción de detecciones de la variante que existen en FP32
+            "precisión": round(len(matches) / candidate_total, 3) if candidate_total else None,
+            "iou_medio": round(float(np.mean([m[0] for m in matches])), 3) if matches else None,
+            "clase_ok": round(float(np.mean([m[1] for m in matches])), 3) if matches else None,
+            "mb": round(artifact_mb(path), 1),
+            "error": "",
+        })
+    return rows
@@ -0,0 +1,165 @@
+"""
+Dibujo rápido de detecciones a partir de arrays NumPy, con etiquetas precalculadas y buffer reutilizable
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from detections import results_to_array
+
+# Paleta de Ultralytics (RGB) convertida a BGR, para que los colores coincidan con results.plot()
+PALETTE = np.array([
+    tuple(int(h[i:i + 2], 16) for i in (4, 2, 0))
+    for h in ("FF3838", "FF9D97", "FF701F", "FFB21D", "CFD231", "48F90A", "92CC17", "3DDB86", "1A9334", "00D4BB",
+              "2C99A8", "00C2FF", "344593", "6473FF", "0018EC", "8438FF", "520085", "CB38FF", "FF95C8", "FF37C7")
+], dtype=np.uint8)
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+MAX_GLYPHS = 2048
+
+
+class GlyphCache:
+    """Caché LRU de etiquetas ya rasterizadas (texto sobre fondo de color) compartida entre hilos"""
+
+    def __init__(self, max_entries=MAX_GLYPHS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text, color, scale, thickness):
+        key = (text, color, scale, thickness)
+        with self._lock:
+            patch = self._entries.get(key)
+            if patch is not None:
+                self._entries.move_to_end(key)
+                return patch
+        patch = self._rasterize(text, color, scale, thickness)
+        with self._lock:
+            self._entries[key] = patch
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return patch
+
+    @staticmethod
+    def _rasterize(text, color, scale, thickness):
+        # Altura fija por escala para que nombre y confianza se puedan unir en horizontal
+        (_, height), baseline = cv2.getTextSize("Ag", FONT, scale, thickness)
+        (width, _), _ = cv2.getTextSize(text, FONT, scale, thickness)
+        patch = np.empty((height + baseline + 3, width + 1, 3), dtype=np.uint8)
+        patch[:] = color
+        # Texto negro sobre colores claros, blanco sobre el resto
+        luminance = 0.114 * color[0] + 0.587 * color[1] + 0.299 * color[2]
+        text_color = (0, 0, 0) if luminance > 160 else (255, 255, 255)
+        cv2.putText(patch, text, (0, height + 1), FONT, scale, text_color, thickness, cv2.LINE_AA)
+        patch.flags.writeable = False
+        return patch
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_glyphs = GlyphCache()
+
+
+class Renderer:
+    """Dibuja cajas y etiquetas en una sola pasada; conserva un buffer de salida para reutilizarlo"""
+
+    def __init__(self, line_width=None, glyphs=None):
+        self.line_width = line_width
+        self.glyphs = glyphs or _glyphs
+        self._buffer = None
+
+    def buffer_like(self, image):
+        """Buffer reutilizable con la forma de la imagen (se sobrescribe en la siguiente llamada)"""
+        if self._buffer is None or self._buffer.shape != image.shape or self._buffer.dtype != image.dtype:
+            self._buffer = np.empty_like(image)
+        return self._buffer
+
+    def draw(self, image, data, names, out=None, labels=True):
+        """Dibujar detecciones (n, 6) o pistas (n, 7) sobre `out` (copia nueva si es None; puede ser la propia imagen)"""
+        if out is None:
+            out = image.copy()
+        elif out is not image:
+            np.copyto(out, image)
+        if len(data) == 0:
+            return out
+
+        height, width = out.shape[:2]
+        lw = self.line_width or max(round((height + width) / 2 * 0.003), 2)
+        scale = round(lw / 3, 2)
+        thickness = max(lw - 1, 1)
+
+        # Coordenadas, colores y textos calculados para todas las cajas a la vez
+        boxes = np.rint(data[:, :4]).astype(np.int32)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width - 1)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height - 1)
+        classes = data[:, 5].astype(np.int32)
+        colors = PALETTE[classes % len(PALETTE)].tolist()
+        confidences = np.char.mod("%.2f", data[:, 4].astype(np.float64))
+        prefixes = np.char.mod("#%d ", data[:, 6].astype(np.int64)) if data.shape[1] > 6 else [""] * len(data)
+
+        for (x1, y1, x2, y2), class_id, color, conf, prefix in zip(boxes.tolist(), classes.tolist(), colors,
+                                                                   confidences, prefixes):
+            color = tuple(color)
+            cv2.rectangle(out, (x1, y1), (x2, y2), color, lw, cv2.LINE_AA)
+            if labels:
+                self._blit_label(out, prefix + names[class_id] + " ", conf, color, scale, thickness, x1, y1)
+        return out
+
+    def _blit_label(self, out, name, conf, color, scale, thickness, x, y):
+        """Copiar la etiqueta (nombre + confianza) encima de la caja, o dentro si no cabe"""
+        name_patch = self.glyphs.get(name, color, scale, thickness)
+        conf_patch = self.glyphs.get(conf, color, scale, thickness)
+        label_h = name_patch.shape[0]
+        top = y - label_h if y >= label_h else y
+        for patch in (name_patch, conf_patch):
+            h, w = patch.shape[:2]
+            x_end = min(x + w, out.shape[1])
+            y_end = min(top + h, out.shape[0])
+            if x_end > x and y_end > top:
+                out[top:y_end, x:x_end] = patch[:y_end - top, :x_end - x]
+            x += w
+
+
+_local = threading.local()
+
+
+def get_renderer():
+    """Renderer del hilo actual (cada hilo tiene su propio buffer)"""
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None:
+        renderer = Renderer()
+        _local.renderer = renderer
+    return renderer
+
+
+def draw_detections(image, data, names, out=None):
+    """Dibujar detecciones (n, 6) sobre una imagen BGR"""
+    return get_renderer().draw(image, data, names, out=out)
+
+
+def render_result(result, out=None, reuse_buffer=False):
+    """Dibujar un Results de Ultralytics; con reuse_buffer la salida solo es válida hasta la siguiente llamada"""
+    renderer = get_renderer()
+    if reuse_buffer:
+        out = renderer.buffer_like(result.orig_img)
+    return renderer.draw(result.orig_img, results_to_array(result), result.names, out=out)
+
+
+def detection_rows(data, names):
+    """Tabla de detecciones (columnas) construida desde el array (n, 6) sin recorrer cajas"""
+    classes = data[:, 5].astype(np.int64)
+    lookup = np.array([names[i] for i in range(len(names))], dtype=object)
+    return {
+        "#": np.arange(1, len(data) + 1),
+        "clase": lookup[classes] if len(data) else np.array([], dtype=object),
+        "confianza": np.round(data[:, 4], 2),
+        "x1": np.round(data[:, 0], 1),
+        "y1": np.round(data[:, 1], 1),
+        "x2": np.round(data[:, 2], 1),
+        "y2": np.round(data[:, 3], 1),
+    }
@@ -0,0 +1,117 @@
+"""
+Caché LRU de detecciones indexada por contenido de imagen, modelo y parámetros de inferencia
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from detections import filter_detections, make_results, results_to_array
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("YOLO_RESULT_CACHE_ENTRIES", "256"))
+DEFAULT_MAX_MB = float(os.environ.get("YOLO_RESULT_CACHE_MB", "64"))
+
+# Los candidatos se guardan con confianza mínima y sin NMS efectivo (IoU 1.0),
+# así que cambiar solo conf/iou se resuelve filtrando sin volver a ejecutar la red
+CANDIDATE_CONF = float(os.environ.get("YOLO_RESULT_CACHE_MIN_CONF", "0.05"))
+CANDIDATE_MAX_DET = 3000
+
+
+def image_digest(image):
+    """Hash del contenido de una imagen BGR"""
+    array = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(array.data, digest_size=16)
+    digest.update(str(array.shape).encode())
+    return digest.hexdigest()
+
+
+class CachedDetections:
+    """Detecciones candidatas (antes del NMS final) de una imagen"""
+
+    def __init__(self, data, names):
+        self.data = data
+        self.names = names
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class ResultCache:
+    """LRU limitada por número de entradas y por bytes"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=int(DEFAULT_MAX_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def cached_predict(predict_fn, weights, image, conf, iou, cache=None, **kwargs):
+    """Inferencia con caché; devuelve ([Results], acierto_de_caché)"""
+    if conf < CANDIDATE_CONF:
+        # Por debajo del umbral de candidatos la caché no tiene toda la información
+        return predict_fn(image, conf=conf, iou=iou, **kwargs), False
+
+    cache = cache or get_result_cache()
+    key = (image_digest(image), weights, tuple(sorted(kwargs.items())))
+    entry = cache.get(key)
+    hit = entry is not None
+    if not hit:
+        results = predict_fn(image, conf=CANDIDATE_CONF, iou=1.0, max_det=CANDIDATE_MAX_DET, **kwargs)
+        entry = CachedDetections(results_to_array(results[0]), results[0].names)
+        cache.put(key, entry)
+
+    data = filter_detections(entry.data, conf, iou)
+    return [make_results(image, entry.names, data)], hit
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Obtener la caché única del proceso"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -3,26 +3,39 @@
 Script de inicio para la aplicación YOLO11 con Streamlit
 """
 
+import argparse
+import importlib.util
 import subprocess
 import sys
 import os
 
 def check_dependencies():
-    """Verificar que las dependencias estén instaladas"""
-    try:
-        import streamlit
-        import ultralytics
-        import cv2
+    """Verificar que las dependencias estén instaladas (sin importarlas: torch tarda varios segundos)"""
+    missing = [name for name in ("streamlit", "ultralytics", "cv2") if importlib.util.find_spec(name) is None]
+    if not missing:
         print("✅ Todas las dependencias están instaladas")
         return True
-    except ImportError as e:
-        print(f"❌ Dependencia faltante: {e}")
-        print("🔧 Instalando dependencias...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-        return True
+    print(f"❌ Dependencia faltante: {', '.join(missing)}")
+    print("🔧 Instalando dependencias...")
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+    return True
 
 def main():
     """Función principal"""
+    # Modo por lotes sin interfaz: python run.py batch <entradas> -o resultados.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch_cli import main as batch_main
+        batch_main(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(description="Iniciar la aplicación YOLO11",
+                                     epilog="Detección por lotes sin interfaz: python run.py batch --help")
+    parser.add_argument("--api", action="store_true", help="Iniciar también la API HTTP de inferencia")
+    parser.add_argument("--api-port", type=int, default=int(os.environ.get("YOLO_API_PORT", "8000")))
+    parser.add_argument("--warm", action="store_true",
+                        help="Precargar y calentar los modelos al iniciar (YOLO_PRELOAD_MODELS)")
+    args = parser.parse_args()
+    
     print("🚀 Iniciando aplicación YOLO11...")
     
     # Verificar dependencias
@@ -33,9 +46,32 @@ def main():
     # Cambiar al directorio del script
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
+    # Streamlit corre en este mismo proceso: la API y la precarga comparten la caché de modelos y empiezan
+    # al arrancar, sin esperar a que se abra la interfaz
+    if args.warm:
+        os.environ["YOLO_WARM_START"] = "1"
+    if args.api:
+        os.environ["YOLO_API_ENABLED"] = "1"
+        os.environ["YOLO_API_PORT"] = str(args.api_port)
+    # Auto-ajuste de hilos (YOLO_AUTOTUNE=1) antes de la precarga, la API y la primera sesión
+    from startup import autotune_at_start, start_warm_start_in_background
+    autotune_at_start()
+    if args.warm:
+        start_warm_start_in_background()
+        print(f"🔥 Arranque en caliente: {os.environ.get('YOLO_PRELOAD_MODELS', 'yolo11n.pt')}")
+    if args.api:
+        from api import API_HOST, start_in_background
+        try:
+            start_in_background(port=args.api_port)
+            print(f"🌐 API de inferencia en http://{API_HOST}:{args.api_port}")
+        except OSError as e:
+            print(f"⚠️ No se pudo iniciar la API: {e}")
+    
     # Ejecutar Streamlit
     try:
-        subprocess.run([sys.executable, "-m", "streamlit", "run", "app.py"])
+        from streamlit.web import cli as stcli
+        sys.argv = ["streamlit", "run", "app.py"]
+        stcli.main()
     except KeyboardInterrupt:
         print("\n👋 Aplicación cerrada por el usuario")
     except Exception as e:
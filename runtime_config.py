@@ -0,0 +1,201 @@
+"""
+Control de hilos de CPU para la inferencia: intra/inter-op, réplicas por modelo, afinidad y auto-ajuste
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+CPU_COUNT = os.cpu_count() or 1
+
+
+def parse_cpu_list(text):
+    """Convertir '0-3,6' en una lista ordenada de CPUs"""
+    cpus = set()
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Configuración del proceso (variables de entorno como valores iniciales)
+_settings = {
+    "intra_threads": _env_int("YOLO_INTRA_OP_THREADS", 0),
+    "inter_threads": _env_int("YOLO_INTER_OP_THREADS", 0),
+    "workers_per_model": _env_int("YOLO_WORKERS_PER_MODEL", 1),
+    "affinity": parse_cpu_list(os.environ.get("YOLO_CPU_AFFINITY", "")),
+}
+_settings_lock = threading.Lock()
+AUTOTUNE_ON_START = os.environ.get("YOLO_AUTOTUNE", "0") == "1"
+
+
+def get_settings():
+    """Configuración de hilos actual"""
+    with _settings_lock:
+        return dict(_settings, affinity=list(_settings["affinity"]))
+
+
+def apply_thread_settings(intra_threads=None, inter_threads=None):
+    """Aplicar el número de hilos intra-op e inter-op de torch"""
+    import torch
+
+    with _settings_lock:
+        if intra_threads is not None:
+            _settings["intra_threads"] = int(intra_threads)
+        if inter_threads is not None:
+            _settings["inter_threads"] = int(inter_threads)
+        intra, inter = _settings["intra_threads"], _settings["inter_threads"]
+
+    if intra > 0:
+        torch.set_num_threads(intra)
+    if inter > 0 and torch.get_num_interop_threads() != inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            # Torch solo permite fijarlo antes del primer trabajo paralelo: requiere reiniciar
+            return False
+    return True
+
+
+def configure(workers_per_model=None, affinity=None):
+    """Ajustar réplicas por modelo y CPUs permitidas para la inferencia"""
+    with _settings_lock:
+        if workers_per_model is not None:
+            _settings["workers_per_model"] = max(1, int(workers_per_model))
+        if affinity is not None:
+            _settings["affinity"] = parse_cpu_list(affinity) if isinstance(affinity, str) else sorted(affinity)
+            cpus = list(_settings["affinity"])
+    if affinity is not None:
+        set_process_affinity(cpus)
+
+
+# Afinidad con la que arrancó el proceso, para restaurarla al vaciar la lista
+_initial_affinity = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+
+
+def set_process_affinity(cpus):
+    """Fijar todos los hilos del proceso a unas CPUs (solo Linux); vacío restaura la afinidad inicial
+
+    os.sched_setaffinity(0, ...) solo afecta al hilo que llama, y el pool OpenMP de torch ya puede
+    existir: se recorre /proc/self/task para aplicarla también a esos hilos. Los hilos que se creen
+    después heredan la afinidad de quien los crea.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    target = set(cpus) if cpus else _initial_affinity
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tids = [0]
+    applied = False
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, target)
+            applied = True
+        except OSError:
+            # El hilo pudo terminar mientras se recorría la lista
+            continue
+    return applied
+
+
+_startup_applied = False
+
+
+def apply_startup_settings():
+    """Aplicar la configuración del entorno una vez al iniciar el proceso"""
+    global _startup_applied
+    with _settings_lock:
+        if _startup_applied:
+            return
+        _startup_applied = True
+    settings = get_settings()
+    if settings["affinity"]:
+        set_process_affinity(settings["affinity"])
+    if settings["intra_threads"] or settings["inter_threads"]:
+        apply_thread_settings()
+
+
+def autotune(weights, imgsz=640, runs=4, candidates=None):
+    """Medir combinaciones de hilos intra-op y réplicas; devuelve (filas, mejor_configuración)"""
+    import torch
+    from ultralytics import YOLO
+
+    if candidates is None:
+        candidates = []
+        for workers in (1, 2, 4):
+            for intra in (1, 2, 4, 8, 16):
+                if workers * intra <= CPU_COUNT:
+                    candidates.append((intra, workers))
+        candidates = candidates or [(1, 1)]
+
+    image = np.random.default_rng(0).integers(0, 255, size=(imgsz, imgsz, 3), dtype=np.uint8)
+    max_workers = max(w for _, w in candidates)
+    replicas = []
+    for _ in range(max_workers):
+        model = YOLO(weights)
+        model.to("cpu")
+        model(image, imgsz=imgsz, device="cpu", verbose=False)
+        replicas.append(model)
+
+    previous = torch.get_num_threads()
+    rows = []
+    try:
+        for intra, workers in candidates:
+            torch.set_num_threads(intra)
+            latencies = []
+            lock = threading.Lock()
+
+            def work(model):
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    model(image, imgsz=imgsz, device="cpu", verbose=False)
+                    with lock:
+                        latencies.append((time.perf_counter() - start) * 1000)
+
+            threads = [threading.Thread(target=work, args=(replicas[i],)) for i in range(workers)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "hilos_intra": intra,
+                "réplicas": workers,
+                "imágenes_s": round(len(latencies) / elapsed, 2),
+                "latencia_ms": round(float(np.median(latencies)), 1),
+            })
+    finally:
+        torch.set_num_threads(previous)
+
+    best = max(rows, key=lambda r: r["imágenes_s"])
+    return rows, {"intra_threads": best["hilos_intra"], "workers_per_model": best["réplicas"]}
+
+
+_autotune_result = None
+_autotune_lock = threading.Lock()
+
+
+def autotune_once(weights):
+    """Ejecutar el auto-ajuste una sola vez por proceso y aplicar la mejor configuración"""
+    global _autotune_result
+    with _autotune_lock:
+        if _autotune_result is None:
+            rows, best = autotune(weights)
+            apply_thread_settings(intra_threads=best["intra_threads"])
+            configure(workers_per_model=best["workers_per_model"])
+            _autotune_result = (rows, best)
+        return _autotune_result
@@ -0,0 +1,136 @@
+"""
+Planificador de inferencia con micro-lotes: agrupa peticiones concurrentes en un solo forward por modelo
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from model_cache import get_registry
+
+DEFAULT_MAX_BATCH = int(os.environ.get("YOLO_BATCH_MAX_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("YOLO_BATCH_MAX_WAIT_MS", "10"))
+ENABLED_BY_DEFAULT = os.environ.get("YOLO_BATCH_ENABLED", "1") == "1"
+
+
+class InferenceRequest:
+    """Imagen pendiente junto con sus parámetros y el futuro a resolver"""
+
+    def __init__(self, image, params):
+        self.image = image
+        self.params = params
+        self.future = Future()
+
+
+class BatchScheduler:
+    """Reúne peticiones durante unos milisegundos y las ejecuta como un único lote"""
+
+    def __init__(self, weights, registry=None, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 device="cpu"):
+        self.weights = weights
+        self.registry = registry or get_registry()
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.device = device
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"scheduler-{weights}", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, **params):
+        """Encolar una imagen y devolver un Future con su Results"""
+        request = InferenceRequest(image, tuple(sorted(params.items())))
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, image, timeout=None, **params):
+        """Inferencia bloqueante de una imagen a través del planificador"""
+        return self.submit(image, **params).result(timeout=timeout)
+
+    def _collect(self):
+        """Esperar la primera petición y reunir las que lleguen dentro de la ventana"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Solo comparten forward las peticiones con los mismos parámetros
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.params, []).append(request)
+            for params, requests in groups.items():
+                kwargs = dict(params)
+                kwargs.setdefault("verbose", False)
+                try:
+                    results = self.registry.predict(self.weights, [r.image for r in requests], device=self.device,
+                                                    **kwargs)
+                    for request, result in zip(requests, results):
+                        request.future.set_result(result)
+                except Exception as e:
+                    for request in requests:
+                        request.future.set_exception(e)
+                self.batches += 1
+                self.requests += len(requests)
+
+    def stats(self):
+        """Tamaño medio de lote alcanzado"""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+_settings = {"max_batch": DEFAULT_MAX_BATCH, "max_wait_ms": DEFAULT_MAX_WAIT_MS}
+
+
+def get_scheduler(weights, device="cpu"):
+    """Obtener el planificador único del proceso para un modelo"""
+    key = (weights, device)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = BatchScheduler(weights, device=device, **_settings)
+            _schedulers[key] = scheduler
+        return scheduler
+
+
+def get_settings():
+    """Configuración actual de los planificadores"""
+    with _schedulers_lock:
+        return dict(_settings)
+
+
+def configure(max_batch=None, max_wait_ms=None):
+    """Ajustar tamaño máximo de lote y espera máxima de todos los planificadores del proceso"""
+    with _schedulers_lock:
+        if max_batch is not None:
+            _settings["max_batch"] = max(1, int(max_batch))
+        if max_wait_ms is not None:
+            _settings["max_wait_ms"] = max(0.0, float(max_wait_ms))
+        for scheduler in _schedulers.values():
+            scheduler.max_batch = _settings["max_batch"]
+            scheduler.max_wait_ms = _settings["max_wait_ms"]
+
+
+def scheduler_stats():
+    """Estadísticas de todos los planificadores activos"""
+    with _schedulers_lock:
+        return [{"modelo": key[0], **scheduler.stats()} for key, scheduler in _schedulers.items()]
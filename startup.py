@@ -0,0 +1,136 @@
+"""
+Arranque en caliente: precarga de pesos, pasada de calentamiento e informe de tiempos por fase
+"""
+
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARM_START = os.environ.get("YOLO_WARM_START", "0") == "1"
+# Pesos a precargar separados por comas, con el backend con el que se cargarán
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("YOLO_PRELOAD_MODELS", "yolo11n.pt").split(",") if m.strip()]
+PRELOAD_BACKEND = os.environ.get("YOLO_PRELOAD_BACKEND", "PyTorch")
+WARMUP_IMGSZ = int(os.environ.get("YOLO_WARMUP_IMGSZ", "640"))
+
+
+def is_installed(name):
+    """Comprobar si un módulo está instalado sin importarlo"""
+    return importlib.util.find_spec(name) is not None
+
+
+class StartupTimer:
+    """Duración de cada fase del arranque del proceso"""
+
+    def __init__(self):
+        self._phases = []
+        self._names = set()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._names.add(name)
+            self._phases.append((name, seconds))
+        logger.info("Arranque · %s: %.2fs", name, seconds)
+
+    def recorded(self, name):
+        with self._lock:
+            return name in self._names
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def rows(self):
+        """Filas fase/segundos para mostrar en tablas"""
+        with self._lock:
+            return [{"fase": name, "segundos": round(seconds, 2)} for name, seconds in self._phases]
+
+    def total(self):
+        with self._lock:
+            return sum(seconds for _, seconds in self._phases)
+
+
+_timer = StartupTimer()
+
+
+def get_startup_timer():
+    """Tiempos de arranque del proceso"""
+    return _timer
+
+
+def timed_import(name):
+    """Importar un módulo pesado la primera vez que se necesita, registrando lo que tarda"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _timer.phase(f"importar {name}"):
+        return importlib.import_module(name)
+
+
+def autotune_at_start(weights=None):
+    """Auto-ajuste de hilos (YOLO_AUTOTUNE=1) una vez por proceso, antes de atender la primera petición"""
+    import runtime_config
+
+    if not runtime_config.AUTOTUNE_ON_START or _timer.recorded("auto-ajuste de hilos"):
+        return
+    weights = weights or next((m for m in PRELOAD_MODELS if m.endswith(".pt")), "yolo11n.pt")
+    try:
+        with _timer.phase("auto-ajuste de hilos"):
+            runtime_config.autotune_once(weights)
+    except Exception as e:
+        logger.warning("Auto-ajuste no disponible: %s", e)
+
+
+def warm_start(models=None, backend=PRELOAD_BACKEND, imgsz=WARMUP_IMGSZ):
+    """Importar ultralytics, descargar/cargar los pesos en la caché compartida y ejecutar una pasada en vacío"""
+    import runtime_config
+    from backends import resolve_model
+    from model_cache import get_registry
+
+    runtime_config.apply_startup_settings()
+    timed_import("ultralytics")
+    # Las réplicas se crean ya con la configuración ajustada
+    autotune_at_start()
+    registry = get_registry()
+    image = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    loaded = []
+    for weights in models or PRELOAD_MODELS:
+        try:
+            with _timer.phase(f"cargar {weights} ({backend})"):
+                # Se exporta al tamaño que usa la aplicación: imgsz solo fija el frame de calentamiento
+                path = resolve_model(weights, backend)
+                entry = registry.get(path, device="cpu")
+            # La primera inferencia reserva memoria y elige kernels: mejor antes de la primera petición
+            with _timer.phase(f"calentar {weights}"):
+                entry.warmup(image, imgsz=imgsz, device="cpu", verbose=False)
+            loaded.append(path)
+        except Exception as e:
+            logger.warning("No se pudo precargar %s: %s", weights, e)
+    return loaded
+
+
+_warm_thread = None
+_warm_lock = threading.Lock()
+
+
+def start_warm_start_in_background():
+    """Lanzar el arranque en caliente una sola vez por proceso sin bloquear la primera página"""
+    global _warm_thread
+    with _warm_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=warm_start, name="warm-start", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
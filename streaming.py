@@ -0,0 +1,215 @@
+"""
+Streaming continuo de frames: worker de inferencia en segundo plano con descarte de frames atrasados
+"""
+
+import threading
+import time
+import weakref
+
+import cv2
+import numpy as np
+
+
+class LatestFrameWorker:
+    """Procesa siempre el frame más reciente; los frames que llegan mientras infiere se descartan"""
+
+    def __init__(self, process_fn, name="stream-worker"):
+        self.process_fn = process_fn
+        self._pending = None
+        self._output = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.latency_ms = 0.0
+        self.error = None
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, timestamp=None):
+        """Entregar un frame nuevo reemplazando al pendiente si aún no se procesó"""
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (frame, timestamp if timestamp is not None else time.perf_counter())
+            self.submitted += 1
+            self._cond.notify()
+
+    def latest(self):
+        """Último resultado disponible: (frame_anotado, resultado) o None"""
+        with self._cond:
+            return self._output
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while self._pending is None and not self._stop.is_set():
+                    self._cond.wait(timeout=0.5)
+                if self._stop.is_set():
+                    return
+                frame, received = self._pending
+                self._pending = None
+            try:
+                output = self.process_fn(frame)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                continue
+            # Latencia de extremo a extremo desde la captura (o llegada) del frame
+            latency = (time.perf_counter() - received) * 1000
+            with self._cond:
+                self._output = output
+                self.processed += 1
+                self.latency_ms = latency if self.processed == 1 else 0.8 * self.latency_ms + 0.2 * latency
+
+    def stats(self):
+        """Estadísticas de procesamiento del worker"""
+        elapsed = max(time.time() - self._started, 1e-6)
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "fps": self.processed / elapsed,
+                "latency_ms": self.latency_ms,
+            }
+
+    def stop(self):
+        """Detener el hilo del worker"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+
+class SessionResource:
+    """Envoltorio de un recurso con hilo propio: se detiene al llamar a stop() o cuando se descarta el envoltorio"""
+
+    def __init__(self, resource):
+        self.resource = resource
+        # El finalizador no referencia al envoltorio: al cerrarse la sesión se recolecta y detiene el recurso
+        self._finalizer = weakref.finalize(self, resource.stop)
+
+    def stop(self):
+        """Detener el recurso (solo la primera llamada tiene efecto)"""
+        self._finalizer()
+
+
+class LatestFrameReader:
+    """Lee continuamente de una fuente tipo VideoCapture en su propio hilo y conserva solo el último frame"""
+
+    def __init__(self, cap, on_frame=None, pace_fps=None, name="capture-reader"):
+        self.cap = cap
+        self.on_frame = on_frame
+        self.pace_fps = pace_fps
+        self.frames = 0
+        self.finished = False
+        self.error = None
+        self._frame = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.pace_fps if self.pace_fps else 0.0
+        next_time = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                # Leer sin pausa vacía el buffer del driver: nunca se acumulan frames viejos
+                ret, frame = self.cap.read()
+                if not ret or frame is None:
+                    break
+                timestamp = time.perf_counter()
+                with self._lock:
+                    self._frame = (frame, timestamp)
+                    self.frames += 1
+                if self.on_frame is not None:
+                    self.on_frame(frame, timestamp)
+                if interval:
+                    # Fuentes de archivo: reproducir a la velocidad original
+                    next_time += interval
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_time = time.perf_counter()
+        except Exception as e:
+            self.error = e
+        finally:
+            # La fuente se libera en el propio hilo lector: nunca mientras otra llamada a read() sigue en curso
+            self.cap.release()
+            self.finished = True
+
+    def latest(self):
+        """Último frame capturado: (frame, instante_de_captura) o None"""
+        with self._lock:
+            return self._frame
+
+    def stats(self):
+        """Frames leídos y FPS de captura"""
+        elapsed = max(time.time() - self._started, 1e-6)
+        return {"frames": self.frames, "fps": self.frames / elapsed, "finished": self.finished}
+
+    def stop(self):
+        """Detener la lectura; el hilo lector libera la fuente al salir"""
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+
+class SyntheticFrameSource:
+    """Fuente de frames sintética con la interfaz de cv2.VideoCapture, para pruebas sin cámara"""
+
+    def __init__(self, width=640, height=480, fps=30.0, frames=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = frames
+        self.index = 0
+        self._opened = True
+        self._last = None
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened or (self.frames is not None and self.index >= self.frames):
+            return False, None
+        # Respetar la cadencia de una cámara real
+        if self.fps and self._last is not None:
+            wait = 1.0 / self.fps - (time.perf_counter() - self._last)
+            if wait > 0:
+                time.sleep(wait)
+        self._last = time.perf_counter()
+
+        frame = np.full((self.height, self.width, 3), 40, dtype=np.uint8)
+        x = int((self.index * 7) % max(self.width - 120, 1))
+        y = int(self.height / 2 + np.sin(self.index / 15) * self.height / 4) - 60
+        cv2.rectangle(frame, (x, y), (x + 120, y + 120), (0, 200, 255), -1)
+        cv2.putText(frame, f"frame {self.index}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+        else:
+            return False
+        return True
+
+    def release(self):
+        self._opened = False
@@ -0,0 +1,74 @@
+"""
+Inferencia por teselas solapadas para imágenes de alta resolución, con NMS entre teselas
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from detections import filter_detections, results_to_array
+
+
+def tile_starts(length, tile, stride):
+    """Inicios de las teselas a lo largo de un eje; la última queda alineada con el borde"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(height, width, tile_size=640, overlap=0.2):
+    """Ventanas (x1, y1, x2, y2) que cubren la imagen con el solape indicado (fracción del tamaño)"""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in tile_starts(height, tile_size, stride)
+        for x in tile_starts(width, tile_size, stride)
+    ]
+
+
+def _predict_tiles(predict_fn, image, windows, imgsz, **kwargs):
+    """Inferir un lote de teselas y llevar sus cajas a coordenadas de la imagen completa"""
+    crops = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+    results = predict_fn(crops, imgsz=imgsz, verbose=False, **kwargs)
+    detections = []
+    for (x1, y1, _, _), result in zip(windows, results):
+        data = results_to_array(result)
+        data[:, [0, 2]] += x1
+        data[:, [1, 3]] += y1
+        detections.append(data)
+    return detections, results[0].names if results else {}
+
+
+def tiled_predict(image, predict_fn, conf=0.25, iou=0.7, tile_size=640, overlap=0.2, batch_size=8, workers=2,
+                  include_full=True, max_det=1000, **kwargs):
+    """Detectar en teselas solapadas (lotes en paralelo) y fusionar con NMS; devuelve (detecciones, nombres, info)"""
+    height, width = image.shape[:2]
+    windows = tile_grid(height, width, tile_size, overlap)
+    batches = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_predict_tiles, predict_fn, image, batch, tile_size, conf=conf, iou=iou, **kwargs)
+                   for batch in batches]
+        if include_full:
+            # Pasada sobre la imagen completa reducida para los objetos grandes que cruzan varias teselas
+            futures.append(pool.submit(_predict_tiles, predict_fn, image, [(0, 0, width, height)], tile_size,
+                                       conf=conf, iou=iou, **kwargs))
+        outputs = [future.result() for future in futures]
+
+    names = next((names for _, names in outputs if names), {})
+    parts = [data for detections, _ in outputs for data in detections]
+    data = np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+    candidates = len(data)
+    data = filter_detections(data, conf, iou, max_det=max_det)
+    info = {
+        "tiles": len(windows),
+        "batches": len(batches),
+        "candidates": candidates,
+        "detections": len(data),
+        "seconds": time.perf_counter() - start,
+    }
+    return data, names, info
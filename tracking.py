@@ -0,0 +1,187 @@
+"""
+Detección cada K frames con seguimiento ligero: IDs persistentes, propagación de cajas y cambios de escena
+"""
+
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from detections import box_iou
+
+# Diferencia media de intensidad (0-255) en miniatura a partir de la cual se considera cambio de escena
+SCENE_THRESHOLD = 30.0
+
+
+class SceneChangeDetector:
+    """Compara una miniatura en grises del frame con la del último frame de referencia"""
+
+    def __init__(self, threshold=SCENE_THRESHOLD, size=32):
+        self.threshold = threshold
+        self.size = size
+        self._reference = None
+
+    def thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def changed(self, frame):
+        """True si el frame difiere de la referencia más que el umbral"""
+        thumb = self.thumbnail(frame)
+        if self._reference is None:
+            return True
+        return float(np.abs(thumb - self._reference).mean()) > self.threshold
+
+    def set_reference(self, frame):
+        self._reference = self.thumbnail(frame)
+
+
+class IoUTracker:
+    """Seguimiento por IoU con movimiento de velocidad constante entre detecciones"""
+
+    def __init__(self, iou_threshold=0.3, max_age=3):
+        self.iou_threshold = iou_threshold
+        # Detecciones consecutivas sin emparejar antes de eliminar una pista
+        self.max_age = max_age
+        self.next_id = 1
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.conf = np.zeros(0, dtype=np.float32)
+        self.cls = np.zeros(0, dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.since_update = np.zeros(0, dtype=np.int64)
+        self.unique = Counter()
+
+    def propagate(self):
+        """Avanzar las pistas un frame sin detecciones"""
+        self.boxes += self.velocity
+        self.since_update += 1
+        return self.tracks()
+
+    def update(self, data):
+        """Avanzar un frame y emparejar con detecciones (n, 6): x1, y1, x2, y2, conf, cls"""
+        self.propagate()
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        matched_tracks, matched_dets = self._match(data)
+
+        # Velocidad por frame a partir del desplazamiento desde la última actualización
+        if len(matched_tracks):
+            t, d = np.asarray(matched_tracks), np.asarray(matched_dets)
+            previous = self.boxes[t] - self.velocity[t] * self.since_update[t, None]
+            self.velocity[t] = (data[d, :4] - previous) / np.maximum(self.since_update[t, None], 1)
+            self.boxes[t] = data[d, :4]
+            self.conf[t] = data[d, 4]
+            self.missed[t] = 0
+            self.since_update[t] = 0
+
+        unmatched = np.ones(len(self.ids), dtype=bool)
+        unmatched[list(matched_tracks)] = False
+        self.missed[unmatched] += 1
+        keep = self.missed <= self.max_age
+        for name in ("boxes", "velocity", "conf", "cls", "ids", "missed", "since_update"):
+            setattr(self, name, getattr(self, name)[keep])
+
+        new = np.setdiff1d(np.arange(len(data)), matched_dets)
+        if len(new):
+            ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            self.boxes = np.concatenate([self.boxes, data[new, :4]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 4), dtype=np.float32)])
+            self.conf = np.concatenate([self.conf, data[new, 4]])
+            self.cls = np.concatenate([self.cls, data[new, 5]])
+            self.ids = np.concatenate([self.ids, ids])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new), dtype=np.int64)])
+            self.since_update = np.concatenate([self.since_update, np.zeros(len(new), dtype=np.int64)])
+            self.unique.update(data[new, 5].astype(np.int64).tolist())
+        return self.tracks()
+
+    def _match(self, data):
+        """Emparejamiento voraz entre pistas y detecciones de la misma clase (IoU y después distancia)"""
+        if not len(self.ids) or not len(data):
+            return [], []
+        ious = np.stack([box_iou(box, data[:, :4]) for box in self.boxes])
+        ious[self.cls[:, None] != data[None, :, 5]] = 0
+        tracks, dets = [], []
+        for flat in np.argsort(-ious, axis=None):
+            t, d = divmod(int(flat), len(data))
+            if ious[t, d] < self.iou_threshold:
+                break
+            if t in tracks or d in dets:
+                continue
+            tracks.append(t)
+            dets.append(d)
+
+        # Con K grande un objeto rápido puede no solaparse: segunda pasada por distancia entre centros
+        centers = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+        det_centers = (data[:, :2] + data[:, 2:4]) / 2
+        diagonal = np.hypot(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+        distance = np.linalg.norm(centers[:, None] - det_centers[None], axis=2) / np.maximum(diagonal[:, None], 1)
+        distance[self.cls[:, None] != data[None, :, 5]] = np.inf
+        for flat in np.argsort(distance, axis=None):
+            t, d = divmod(int(flat), len(data))
+            if distance[t, d] > 1.0:
+                break
+            if t in tracks or d in dets:
+                continue
+            tracks.append(t)
+            dets.append(d)
+        return tracks, dets
+
+    def tracks(self):
+        """Pistas visibles (n, 7): x1, y1, x2, y2, conf, cls, id (sin las que no se vieron en la última detección)"""
+        visible = self.missed == 0
+        return np.concatenate([
+            self.boxes[visible], self.conf[visible, None], self.cls[visible, None],
+            self.ids[visible, None].astype(np.float32),
+        ], axis=1)
+
+    def unique_counts(self, names):
+        """Objetos distintos vistos por clase"""
+        return {names[class_id]: count for class_id, count in self.unique.most_common()}
+
+
+class TrackedDetector:
+    """Decide en qué frames ejecutar el detector (cada K o tras un cambio de escena) y sigue el resto"""
+
+    def __init__(self, detect_every=5, scene_threshold=SCENE_THRESHOLD, iou_threshold=0.3, max_age=3):
+        self.detect_every = max(1, int(detect_every))
+        self.scene = SceneChangeDetector(scene_threshold) if scene_threshold else None
+        self.tracker = IoUTracker(iou_threshold=iou_threshold, max_age=max_age)
+        self._since_detection = None
+        self.frames = 0
+        self.detected_frames = 0
+
+    def needs_detection(self, frame):
+        """Decidir (en orden) si el frame es un frame clave"""
+        due = self._since_detection is None or self._since_detection + 1 >= self.detect_every
+        if not due and self.scene is not None and self.scene.changed(frame):
+            due = True
+        if due:
+            self._since_detection = 0
+            if self.scene is not None:
+                self.scene.set_reference(frame)
+        else:
+            self._since_detection += 1
+        return due
+
+    def advance(self, data=None):
+        """Avanzar un frame: con detecciones (n, 6) en frames clave o propagando en el resto"""
+        self.frames += 1
+        if data is None:
+            return self.tracker.propagate()
+        self.detected_frames += 1
+        return self.tracker.update(data)
+
+    def step(self, frame, detect_fn):
+        """Procesar un frame con detect_fn(frame) -> (n, 6) solo cuando hace falta; devuelve (pistas, detectado)"""
+        if self.needs_detection(frame):
+            return self.advance(detect_fn(frame)), True
+        return self.advance(), False
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "detected_frames": self.detected_frames,
+            "tracks": self.tracker.next_id - 1,
+        }
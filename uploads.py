@@ -0,0 +1,74 @@
+"""
+Almacenamiento en disco de archivos subidos, por bloques y deduplicado por hash de contenido
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "yolo11_uploads")
+CHUNK_SIZE = 1024 * 1024
+MAX_AGE_HOURS = float(os.environ.get("YOLO_UPLOAD_MAX_AGE_H", "6"))
+
+
+def iter_chunks(uploaded_file, chunk_size=CHUNK_SIZE):
+    """Recorrer el contenido por bloques sin copiarlo entero en memoria"""
+    getbuffer = getattr(uploaded_file, "getbuffer", None)
+    if getbuffer is not None:
+        # UploadedFile de Streamlit es un BytesIO: se leen vistas sobre su buffer
+        with memoryview(getbuffer()) as view:
+            for offset in range(0, len(view), chunk_size):
+                yield view[offset:offset + chunk_size]
+        return
+
+    uploaded_file.seek(0)
+    while True:
+        chunk = uploaded_file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def spool_upload(uploaded_file, directory=UPLOAD_DIR, suffix=None):
+    """Escribir una subida en disco y devolver la ruta nombrada por su hash"""
+    os.makedirs(directory, exist_ok=True)
+    if suffix is None:
+        suffix = os.path.splitext(getattr(uploaded_file, "name", ""))[1].lower() or ".bin"
+
+    digest = hashlib.sha256()
+    fd, part_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter_chunks(uploaded_file):
+                digest.update(chunk)
+                out.write(chunk)
+        final_path = os.path.join(directory, digest.hexdigest() + suffix)
+        if os.path.exists(final_path):
+            os.unlink(part_path)
+            # Renovar la fecha para que la limpieza no lo borre mientras se usa
+            os.utime(final_path)
+        else:
+            os.replace(part_path, final_path)
+    except Exception:
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        raise
+    return final_path
+
+
+def cleanup_uploads(directory=UPLOAD_DIR, max_age_hours=MAX_AGE_HOURS):
+    """Eliminar archivos subidos que no se han usado en las últimas horas"""
+    if not os.path.isdir(directory):
+        return 0
+    limit = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.unlink(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
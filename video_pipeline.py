@@ -0,0 +1,291 @@
+"""
+Pipeline de video por frames con memoria acotada (decodificar → lote → inferir → anotar → codificar)
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+import cv2
+
+from detections import results_to_array
+from metrics import get_metrics
+from renderer import draw_detections, render_result
+from tracking import SCENE_THRESHOLD, TrackedDetector
+
+# Directorio donde se guardan los videos anotados
+OUTPUT_DIR = os.path.join("runs", "stream")
+
+# Hilos por etapa del motor de video (inferencia y anotación)
+DEFAULT_WORKERS = int(os.environ.get("YOLO_VIDEO_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_DONE = object()
+
+
+def read_frames(path, metrics_input=None):
+    """Decodificar el video frame a frame"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el video: {path}")
+    metrics = get_metrics() if metrics_input else None
+    try:
+        index = 0
+        while True:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if metrics is not None:
+                metrics.observe("decode", (time.perf_counter() - start) * 1000, metrics_input)
+            yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def video_info(path):
+    """Obtener fps, tamaño y número de frames del video"""
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    return fps, (width, height), total
+
+
+def batched(frames, batch_size):
+    """Agrupar frames en lotes de tamaño fijo"""
+    if batch_size < 1:
+        raise ValueError(f"El tamaño de lote debe ser al menos 1: {batch_size}")
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_detections(counts, result):
+    """Acumular el número de detecciones por clase"""
+    names = result.names
+    for class_id in result.boxes.cls.tolist():
+        counts[names[int(class_id)]] += 1
+
+
+def default_output_path(path):
+    """Ruta del video anotado dentro de runs/stream"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(OUTPUT_DIR, f"{name}_detections.mp4")
+
+
+def process_video_threaded(path, predict_fn, batch_size=4, workers=DEFAULT_WORKERS, queue_size=None,
+                           output_path=None, progress=None, metrics_input="video", **kwargs):
+    """Procesar un video con decodificación, inferencia y anotación/escritura en hilos separados"""
+    fps, size, total = video_info(path)
+    metrics = get_metrics()
+    if output_path is None:
+        output_path = default_output_path(path)
+    workers = max(1, int(workers))
+    queue_size = queue_size or 2 * workers
+
+    # Colas acotadas entre etapas: la memoria no depende de la duración del video
+    decoded = queue.Queue(maxsize=queue_size)
+    inferred = queue.Queue(maxsize=queue_size)
+    annotated = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    # Lotes en vuelo desde el decodificador hasta el escritor: acota también el búfer de reordenación
+    in_flight = threading.Semaphore(queue_size)
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def acquire():
+        while not stop.is_set():
+            if in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def decode():
+        try:
+            for seq, batch in enumerate(batched(read_frames(path, metrics_input), batch_size)):
+                if not acquire() or not put(decoded, (seq, batch)):
+                    return
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(workers):
+                put(decoded, _DONE)
+
+    def infer(item):
+        seq, batch = item
+        results = predict_fn([frame for _, frame in batch], **kwargs)
+        return seq, [(index, result) for (index, _), result in zip(batch, results)]
+
+    def draw(item):
+        seq, items = item
+        drawn = []
+        for index, result in items:
+            with metrics.time("annotate", metrics_input):
+                drawn.append((index, render_result(result, out=result.orig_img), result))
+        return seq, drawn
+
+    def stage(fn, in_q, out_q, remaining, downstream):
+        try:
+            while True:
+                item = get(in_q)
+                if item is _DONE:
+                    break
+                if not put(out_q, fn(item)):
+                    break
+        except Exception as e:
+            fail(e)
+        finally:
+            with remaining["lock"]:
+                remaining["count"] -= 1
+                last = remaining["count"] == 0
+            if last:
+                for _ in range(downstream):
+                    put(out_q, _DONE)
+
+    infer_left = {"count": workers, "lock": threading.Lock()}
+    draw_left = {"count": workers, "lock": threading.Lock()}
+    threads = [threading.Thread(target=decode, name="video-decode", daemon=True)]
+    for i in range(workers):
+        threads.append(threading.Thread(target=stage, args=(infer, decoded, inferred, infer_left, workers),
+                                        name=f"video-infer-{i}", daemon=True))
+        threads.append(threading.Thread(target=stage, args=(draw, inferred, annotated, draw_left, 1),
+                                        name=f"video-annotate-{i}", daemon=True))
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+
+    # Escritura en el hilo llamante, reordenando los lotes por número de secuencia
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    counts = Counter()
+    frames = 0
+    pending = {}
+    next_seq = 0
+    try:
+        while True:
+            item = get(annotated)
+            if item is _DONE:
+                break
+            seq, items = item
+            pending[seq] = items
+            while next_seq in pending:
+                for index, frame, result in pending.pop(next_seq):
+                    with metrics.time("encode", metrics_input):
+                        writer.write(frame)
+                    frames += 1
+                    count_detections(counts, result)
+                    if progress is not None:
+                        progress(index + 1, total, time.time() - start)
+                next_seq += 1
+                in_flight.release()
+    except Exception as e:
+        fail(e)
+    finally:
+        stop.set()
+        writer.release()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return {
+        "output_path": output_path,
+        "frames": frames,
+        "total_frames": total,
+        "seconds": time.time() - start,
+        "detections": dict(counts),
+    }
+
+
+def process_video_tracked(path, predict_fn, detect_every=5, scene_threshold=SCENE_THRESHOLD, batch_size=4,
+                          output_path=None, progress=None, metrics_input="video", **kwargs):
+    """Procesar un video detectando solo en frames clave (cada K o tras cambio de escena) y siguiendo el resto"""
+    fps, size, total = video_info(path)
+    if output_path is None:
+        output_path = default_output_path(path)
+    tracked = TrackedDetector(detect_every, scene_threshold)
+    metrics = get_metrics()
+    names = {}
+
+    # Un segundo lector se adelanta y solo conserva los frames clave: se infieren en lotes de `batch_size`
+    # sin retener los frames intermedios, que el lector principal vuelve a decodificar uno a uno
+    keys = ((index, frame) for index, frame in read_frames(path) if tracked.needs_detection(frame))
+    key_batches = batched(keys, batch_size)
+    detections = deque()
+
+    def next_detections():
+        nonlocal names
+        batch = next(key_batches, None)
+        if batch is None:
+            return False
+        results = predict_fn([frame for _, frame in batch], **kwargs)
+        for (index, _), result in zip(batch, results):
+            detections.append((index, results_to_array(result)))
+            names = result.names
+        return True
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    start = time.time()
+    frames = 0
+    more_keys = True
+    try:
+        for index, frame in read_frames(path, metrics_input):
+            if not detections and more_keys:
+                more_keys = next_detections()
+            data = None
+            if detections and detections[0][0] == index:
+                data = detections.popleft()[1]
+            tracks = tracked.advance(data)
+            with metrics.time("annotate", metrics_input):
+                annotated = draw_detections(frame, tracks, names, out=frame)
+            with metrics.time("encode", metrics_input):
+                writer.write(annotated)
+            frames += 1
+            if progress is not None:
+                progress(index + 1, total, time.time() - start)
+    finally:
+        writer.release()
+        key_batches.close()
+        keys.close()
+
+    return {
+        "output_path": output_path,
+        "frames": frames,
+        "total_frames": total,
+        "seconds": time.time() - start,
+        "detected_frames": tracked.detected_frames,
+        "unique_objects": tracked.tracker.unique_counts(names),
+    }